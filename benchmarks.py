@@ -0,0 +1,379 @@
+"""
+Microbenchmarks for the planning, generation, rendering and command
+interpretation hot paths, parameterized by grid size, object count and
+obstacle density. Results are written as JSON, and a saved run can be used
+as a baseline to flag regressions.
+
+With --backends it instead loads each classifier backend in its own
+process and compares their labels, latency and memory on BACKEND_COMMANDS.
+
+Examples:
+    python benchmarks.py --output baseline.json
+    python benchmarks.py --quick --filter find_path
+    python benchmarks.py --output current.json --compare baseline.json --threshold 0.15
+    python benchmarks.py --backends pipeline quantized onnx distilled --distilled-model ./distilbart-mnli
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+import robo
+
+
+GRID_SIZES = [15, 50, 100, 200, 500]
+DENSITIES = [0.0, 0.1, 0.3]
+OBJECT_COUNTS = [9, 100, 1000]
+WORLD_CASES = [(100, 1000), (1000, 100000)]
+RENDER_GRID_SIZES = [15, 50, 100]
+RENDER_OBJECT_COUNTS = [10, 100, 1000]
+
+# Commands for comparing classifier backends; most are phrased to miss the keyword rules
+BACKEND_COMMANDS = [
+    "move forward", "turn left", "turn right", "sort objects by color", "sort objects by shape",
+    "pick up this object", "drop the object",
+    "go one step ahead", "advance a bit", "rotate counterclockwise", "spin to your left",
+    "swing clockwise", "face the other way to the right", "put things in order by their hues",
+    "organize everything according to its form", "group the circles, squares and triangles",
+    "could you tidy things up by colour", "grab that", "collect the item in front of you",
+    "let it go", "place it here", "release what you are holding", "hmm", "do the thing",
+]
+
+
+def make_world(grid_size, density, seed=0):
+    """Scatter objects over a fraction `density` of the cells, keeping both corners free."""
+    rng = random.Random(seed)
+    width, height = grid_size
+    corners = {(0, 0), (width - 1, height - 1)}
+    cells = [(x, y) for x in range(width) for y in range(height) if (x, y) not in corners]
+    store = robo.ObjectStore(capacity=int(len(cells) * density))
+    return [store.add(rng.choice(robo.SHAPES), rng.choice(robo.COLORS), cell)
+            for cell in rng.sample(cells, int(len(cells) * density))]
+
+
+def stub_classifier(sequences, candidate_labels, **kwargs):
+    """Deterministic stand-in for the zero-shot pipeline."""
+    def classify(text):
+        scores = np.random.default_rng(len(text)).random(len(candidate_labels))
+        scores /= scores.sum()
+        order = np.argsort(-scores)
+        return {"sequence": text, "labels": [candidate_labels[i] for i in order],
+                "scores": [float(scores[i]) for i in order]}
+
+    if isinstance(sequences, str):
+        return classify(sequences)
+    return [classify(text) for text in sequences]
+
+
+def bench_find_path(grid, density):
+    grid_size = (grid, grid)
+    grid_objects = make_world(grid_size, density)
+    return lambda: robo.find_path((0, 0), (grid - 1, grid - 1), grid_objects, grid_size)
+
+
+def bench_find_path_oriented(grid, density):
+    grid_size = (grid, grid)
+    grid_objects = make_world(grid_size, density)
+    return lambda: robo.find_path((0, 0), (grid - 1, grid - 1), grid_objects, grid_size, orientation='N')
+
+
+def bench_find_nearest_unsorted_object(grid, density):
+    grid_size = (grid, grid)
+    grid_objects = make_world(grid_size, max(density, 0.01))
+    robot = robo.AutonomousRobot((0, 0), 'N', grid_size, grid_objects)
+    # Without sorting areas no object counts as sortable and the search returns at once
+    robot.initialize_sorting("SORT_BY_COLOR")
+    assert robot.find_nearest_unsorted_object() is not None, "no reachable unsorted object"
+    return robot.find_nearest_unsorted_object
+
+
+def bench_generate_random_objects(grid, objects):
+    grid_size = (grid, grid)
+    sorting_areas = robo.create_sorting_areas(grid_size, "SORT_BY_COLOR")
+    return lambda: robo.generate_random_objects(objects, grid_size, sorting_areas)
+
+
+def bench_generate_world(grid, objects):
+    """Tile sorting areas sized for the objects, then generate them."""
+    grid_size = (grid, grid)
+    capacity = -(-objects // len(robo.COLORS))
+
+    def run():
+        sorting_areas = robo.create_sorting_areas(grid_size, "SORT_BY_COLOR", capacity=capacity)
+        return robo.generate_random_objects(objects, grid_size, sorting_areas)
+    return run
+
+
+def bench_find_position_in_sorting_area(grid, density):
+    grid_size = (grid, grid)
+    grid_objects = make_world(grid_size, density)
+    robot = robo.AutonomousRobot((0, 0), 'N', grid_size, grid_objects)
+    area = robo.create_sorting_areas(grid_size, "SORT_BY_COLOR")[-1]
+    return lambda: robot.find_position_in_sorting_area(area)
+
+
+def bench_render(grid, objects, event):
+    """
+    Time GridRenderer.render after one robot event: a "move" only blits the
+    robot over the cached background, a "pick_drop" (picking an object up,
+    then dropping it again on the next call) redraws the whole grid.
+    """
+    grid_size = (grid, grid)
+    grid_objects = make_world(grid_size, min(1.0, objects / (grid * grid - 2)))
+    sorting_areas = robo.create_sorting_areas(grid_size, "SORT_BY_COLOR")
+    # An object outside every area, so dropping it back never marks it sorted
+    obj = next(obj for obj in grid_objects
+               if not any(area.contains_position(obj.position) for area in sorting_areas))
+    robot = robo.AutonomousRobot(obj.position, 'N', grid_size, grid_objects)
+    robot.sorting_areas = sorting_areas
+    fig = plt.figure(figsize=(10, 10))
+    renderer = robo.GridRenderer(fig, fig.add_subplot(111), frame_delay=0)
+    renderer.render(robot, "Benchmark")
+    x, y = obj.position
+    cells = [(x, y), (x + 1 if x + 1 < grid else x - 1, y)]
+
+    def move():
+        robot.pos = cells[robot.pos == cells[0]]
+        renderer.render(robot, "Benchmark")
+
+    def pick_drop():
+        if robot.inventory:
+            robot.drop_object()
+        else:
+            robot.pick_up_object(obj)
+        renderer.render(robot, "Benchmark")
+    return {"move": move, "pick_drop": pick_drop}[event]
+
+
+def bench_interpret_command(path):
+    robo.classifier_provider.set_classifier(stub_classifier, "stub")
+    commands = {
+        "rule": ["sort objects by color", "turn left", "move forward", "drop the object"],
+        "model": ["could you tidy things up", "do the thing with the hues", "spin about", "hmm"],
+    }[path if path != "cache" else "model"]
+
+    def run():
+        for command in commands:
+            robo.interpret_command(command)
+
+    if path == "cache":
+        robo.command_cache = robo.CommandCache()
+        run()
+    else:
+        # A zero-size cache never hits, so every command pays its full path
+        robo.command_cache = robo.CommandCache(maxsize=0)
+    return run
+
+
+def cases(quick=False):
+    """Yield (name, params, setup) for every benchmark case."""
+    grid_sizes = [g for g in GRID_SIZES if not quick or g <= 100]
+    for grid in grid_sizes:
+        for density in DENSITIES:
+            yield "find_path", {"grid": grid, "density": density}, bench_find_path
+            yield "find_path_oriented", {"grid": grid, "density": density}, bench_find_path_oriented
+            yield "find_nearest_unsorted_object", {"grid": grid, "density": density}, bench_find_nearest_unsorted_object
+            yield "find_position_in_sorting_area", {"grid": grid, "density": density}, bench_find_position_in_sorting_area
+        for objects in OBJECT_COUNTS:
+            if objects <= grid * grid // 2:
+                yield "generate_random_objects", {"grid": grid, "objects": objects}, bench_generate_random_objects
+    for grid, objects in WORLD_CASES:
+        if not quick or grid <= 100:
+            yield "generate_world", {"grid": grid, "objects": objects}, bench_generate_world
+    for grid in RENDER_GRID_SIZES:
+        for objects in RENDER_OBJECT_COUNTS:
+            if objects < grid * grid and (not quick or objects <= 100):
+                for event in ["move", "pick_drop"]:
+                    yield "render", {"grid": grid, "objects": objects, "event": event}, bench_render
+    for path in ["rule", "model", "cache"]:
+        yield "interpret_command", {"path": path}, bench_interpret_command
+
+
+def case_id(name, params):
+    return f"{name}[{','.join(f'{key}={value}' for key, value in params.items())}]"
+
+
+def measure(func, min_time=0.2, min_runs=3, max_runs=1000):
+    """Time func repeatedly; returns per-call timings in seconds."""
+    timings = []
+    total = 0.0
+    while len(timings) < min_runs or (total < min_time and len(timings) < max_runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+    return timings
+
+
+def run(quick=False, name_filter=None, min_time=0.2):
+    results = {}
+    for name, params, setup in cases(quick):
+        key = case_id(name, params)
+        if name_filter and name_filter not in key:
+            continue
+        random.seed(0)
+        func = setup(**params)
+        func()  # warm-up
+        timings = measure(func, min_time=min_time)
+        results[key] = {"median": statistics.median(timings), "min": min(timings), "runs": len(timings)}
+        print(f"{key:<60} {results[key]['median'] * 1e3:10.3f} ms  ({len(timings)} runs)", flush=True)
+        plt.close('all')
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the change against baseline per case; returns the ids of regressed cases."""
+    regressions = []
+    print(f"\n{'case':<60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["median"]
+        after = result["median"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key:<60} {before * 1e3:10.3f}ms {after * 1e3:10.3f}ms {change:+8.1%}{flag}")
+    return regressions
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def profile_backend(backend, model_name=robo.MODEL_NAME, commands=BACKEND_COMMANDS):
+    """
+    Load one classifier backend and classify the commands one call at a time,
+    as interpret_command does. Returns its load time, latencies, memory and
+    the label chosen for each command.
+    """
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    classifier = robo.load_classifier(model_name, backend)
+    load_time = time.perf_counter() - start
+    classifier(commands[0], robo.COMMAND_LABELS)  # warm-up
+
+    labels, timings = [], []
+    for command in commands:
+        start = time.perf_counter()
+        output = classifier(command, robo.COMMAND_LABELS)
+        timings.append(time.perf_counter() - start)
+        labels.append(robo._decide_command(output)[0])
+    timings.sort()
+    rss_after = _peak_rss_mb()
+    return {
+        "backend": backend,
+        "model": model_name,
+        "load_s": load_time,
+        "median_ms": statistics.median(timings) * 1e3,
+        "p95_ms": timings[min(len(timings) - 1, int(0.95 * len(timings)))] * 1e3,
+        "peak_rss_mb": rss_after,
+        "model_rss_mb": rss_after - rss_before if rss_after is not None else None,
+        "labels": labels,
+    }
+
+
+def compare_backends(backends, model_name=robo.MODEL_NAME, distilled_model=None):
+    """
+    Profile each backend in a fresh process, so its peak memory is its own,
+    and check every backend against the first one's labels. Returns the
+    profiles and the backends whose labels differ.
+    """
+    profiles = []
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        name = distilled_model if backend == "distilled" else model_name
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            profiles.append(pool.submit(profile_backend, backend, name).result())
+
+    reference = profiles[0]
+    mismatched = []
+    print(f"{'backend':<12}{'load s':>8}{'median ms':>11}{'p95 ms':>9}{'peak MB':>9}{'model MB':>10}  labels")
+    for profile in profiles:
+        differences = [(command, expected, got) for command, expected, got
+                       in zip(BACKEND_COMMANDS, reference["labels"], profile["labels"]) if expected != got]
+        if differences:
+            mismatched.append(profile["backend"])
+        memory = [f"{value:>9.0f}" if value is not None else f"{'-':>9}"
+                  for value in (profile["peak_rss_mb"], profile["model_rss_mb"])]
+        print(f"{profile['backend']:<12}{profile['load_s']:>8.2f}{profile['median_ms']:>11.1f}"
+              f"{profile['p95_ms']:>9.1f}{memory[0]}{memory[1]} "
+              f" {len(differences)} of {len(BACKEND_COMMANDS)} differ from {reference['backend']}")
+        for command, expected, got in differences:
+            print(f"    {command!r}: {expected} -> {got}")
+    return profiles, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the robot's hot paths.")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against a saved JSON run")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown flagged as a regression (default 0.15)")
+    parser.add_argument("--filter", help="Only run cases whose id contains this text")
+    parser.add_argument("--quick", action="store_true", help="Skip grids above 100x100 and large draws")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds spent timing each case")
+    parser.add_argument("--backends", nargs="+", choices=robo.CLASSIFIER_BACKENDS,
+                        help="Compare these classifier backends instead; the first is the reference")
+    parser.add_argument("--model", default=robo.MODEL_NAME, help="Model for the pipeline, quantized and onnx backends")
+    parser.add_argument("--distilled-model", metavar="PATH", help="Local model directory for the distilled backend")
+    args = parser.parse_args()
+
+    if args.backends:
+        if "distilled" in args.backends and not args.distilled_model:
+            parser.error("--backends distilled needs --distilled-model")
+        profiles, mismatched = compare_backends(args.backends, args.model, args.distilled_model)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"commands": BACKEND_COMMANDS, "backends": profiles}, f, indent=2)
+        if mismatched:
+            print(f"\n{', '.join(mismatched)} chose different labels than {args.backends[0]}")
+            sys.exit(1)
+        return
+
+    results = run(quick=args.quick, name_filter=args.filter, min_time=args.min_time)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Fuzz check for FreeSlots, the free-cell tracking of sorting areas. Each
+trial places a random area on a small grid (often flush with one or two of
+its edges), optionally scatters objects in it, then fills and empties it in
+random order. Every cell FreeSlots hands out must connect through free cells
+to a cell outside the area, or the robot could not reach it to drop there.
+Exits non-zero when any area hands out a walled-in cell.
+
+Example:
+    python check_slots.py --trials 1000 --seed 0
+"""
+import argparse
+import random
+import sys
+from collections import deque
+
+import numpy as np
+
+import robo
+
+
+def reaches_outside(occupied, position, size, cell):
+    """Whether cell connects through free cells to a grid cell outside the area."""
+    x0, y0 = position
+    width, height = size
+    grid_width, grid_height = occupied.shape
+    seen = {cell}
+    queue = deque([cell])
+    while queue:
+        x, y = queue.popleft()
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if not (0 <= nx < grid_width and 0 <= ny < grid_height) or (nx, ny) in seen:
+                continue
+            if not (x0 <= nx < x0 + width and y0 <= ny < y0 + height):
+                return True
+            if not occupied[nx, ny]:
+                seen.add((nx, ny))
+                queue.append((nx, ny))
+    return False
+
+
+def run_trial(seed, steps=200, empty_rate=0.15):
+    """Fill and empty one random area; returns the number of walled-in cells handed out."""
+    rng = random.Random(seed)
+    width, height = rng.randint(3, 9), rng.randint(3, 9)
+    grid_size = (width + rng.randint(1, 6), height + rng.randint(1, 6))
+    # Flush with the grid's low or high edge about a third of the time each
+    x = rng.choice([0, grid_size[0] - width, rng.randint(0, grid_size[0] - width)])
+    y = rng.choice([0, grid_size[1] - height, rng.randint(0, grid_size[1] - height)])
+    position, size = (x, y), (width, height)
+
+    occupied = np.zeros(grid_size, dtype=bool)
+    if rng.random() < 1 / 3:
+        for _ in range(rng.randint(0, width * height // 2)):
+            occupied[x + rng.randrange(width), y + rng.randrange(height)] = True
+    slots = robo.FreeSlots(position, size, occupied)
+
+    walled_in = 0
+    for _ in range(steps):
+        filled = np.argwhere(occupied)
+        if len(filled) and rng.random() < empty_rate:
+            cell = tuple(int(v) for v in filled[rng.randrange(len(filled))])
+            occupied[cell] = False
+            slots.update(cell, False)
+            continue
+        cell = slots.nearest((rng.randrange(grid_size[0]), rng.randrange(grid_size[1])))
+        if cell is None:
+            break
+        if occupied[cell]:
+            raise AssertionError(f"trial {seed}: handed out the occupied cell {cell}")
+        walled_in += not reaches_outside(occupied, position, size, cell)
+        occupied[cell] = True
+        slots.update(cell, True)
+    return walled_in
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the free-cell tracking of sorting areas.")
+    parser.add_argument("--trials", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first trial")
+    args = parser.parse_args()
+
+    failed = [seed for seed in range(args.seed, args.seed + args.trials) if run_trial(seed)]
+    print(f"{len(failed)} of {args.trials} areas handed out a walled-in cell")
+    if failed:
+        print("Failing seeds: " + ", ".join(map(str, failed[:20])))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Run seeded sorting episodes headless across a process pool and collect
+statistics on sorting efficiency. The classifier is bypassed: each episode
+builds a random layout and calls AutonomousRobot.run_sorting directly.
+
+Example:
+    python episodes.py --episodes 200 --workers 8 --csv episodes.csv --json summary.json
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import robo
+
+
+METRICS = ["steps", "turns", "distance", "planner_calls", "plan_saved", "steps_saved", "wall_time"]
+
+
+def sort_layout(seed, grid_size, num_objects, sort_by, max_steps, plan_budget=None, carry_capacity=1):
+    """Sort the seeded random layout headless; returns the robot, its objects and the wall time."""
+    random.seed(seed)
+    sorting_areas = robo.create_sorting_areas(grid_size, sort_by)
+    grid_objects = robo.generate_random_objects(num_objects, grid_size, sorting_areas)
+    robot = robo.AutonomousRobot((0, 0), 'N', grid_size, grid_objects)
+    robot.plan_budget = plan_budget
+    robot.carry_capacity = carry_capacity
+
+    start = time.perf_counter()
+    robot.run_sorting(sort_by, max_steps=max_steps)
+    return robot, grid_objects, time.perf_counter() - start
+
+
+def run_episode(seed, grid_size=(15, 15), num_objects=9, sort_by="SORT_BY_COLOR", max_steps=100000,
+                plan_budget=None, carry_capacity=1):
+    """
+    Build a seeded random layout, sort it headless and return the episode's statistics.
+    With plan_budget the pickup order is planned up front (see robo.plan_sort_schedule).
+    With a carry_capacity above 1 the same layout is also sorted carrying one
+    object at a time, and steps_saved is how many steps carrying more saved.
+    """
+    robot, grid_objects, wall_time = sort_layout(seed, grid_size, num_objects, sort_by, max_steps,
+                                                 plan_budget, carry_capacity)
+    steps_saved = 0
+    if carry_capacity > 1:
+        baseline, _, _ = sort_layout(seed, grid_size, num_objects, sort_by, max_steps, plan_budget)
+        steps_saved = baseline.stats["steps"] - robot.stats["steps"]
+
+    return {
+        "seed": seed,
+        "objects": len(grid_objects),
+        "sorted": robot.store.count_sorted(),
+        "complete": robot.sorting_complete,
+        "steps": robot.stats["steps"],
+        "turns": robot.stats["turns"],
+        "distance": robot.stats["distance"],
+        "planner_calls": robot.stats["planner_calls"],
+        "plan_saved": robot.sort_plan.saved if robot.sort_plan else 0,
+        "steps_saved": steps_saved,
+        "wall_time": wall_time,
+    }
+
+
+def _run_episode_args(args):
+    seed, kwargs = args
+    return run_episode(seed, **kwargs)
+
+
+def run_episodes(num_episodes, workers=None, base_seed=0, **episode_kwargs):
+    """Run num_episodes seeded episodes across a process pool; returns them in seed order."""
+    workers = workers or os.cpu_count() or 1
+    jobs = [(base_seed + i, episode_kwargs) for i in range(num_episodes)]
+    if workers == 1:
+        return [_run_episode_args(job) for job in jobs]
+
+    # Hand out work in chunks so the per-task overhead stays small next to the episodes
+    chunksize = max(1, num_episodes // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run_episode_args, jobs, chunksize=chunksize))
+
+
+def summarize(episodes):
+    """Aggregate per-episode results into mean/std/min/median/max per metric."""
+    summary = {
+        "episodes": len(episodes),
+        "completed": sum(1 for episode in episodes if episode["complete"]),
+    }
+    for metric in METRICS:
+        values = [episode[metric] for episode in episodes]
+        if not values:
+            continue
+        summary[metric] = {
+            "mean": statistics.fmean(values),
+            "std": statistics.pstdev(values),
+            "min": min(values),
+            "median": statistics.median(values),
+            "max": max(values),
+        }
+    return summary
+
+
+def write_csv(path, episodes):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(episodes[0]))
+        writer.writeheader()
+        writer.writerows(episodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless sorting episodes in parallel.")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first episode")
+    parser.add_argument("--grid-size", type=int, nargs=2, default=[15, 15], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--objects", type=int, default=9)
+    parser.add_argument("--sort-by", choices=["color", "shape"], default="color")
+    parser.add_argument("--max-steps", type=int, default=100000)
+    parser.add_argument("--plan-budget", type=float, default=None, metavar="SECONDS",
+                        help="Plan the pickup order up front within this many seconds (default: greedy)")
+    parser.add_argument("--carry-capacity", type=int, default=1,
+                        help="Objects the robot can carry at once; above 1, steps_saved compares "
+                             "against carrying one")
+    parser.add_argument("--csv", help="Write per-episode results to this CSV file")
+    parser.add_argument("--json", help="Write the summary and per-episode results to this JSON file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    episodes = run_episodes(args.episodes, workers=args.workers, base_seed=args.seed,
+                            grid_size=tuple(args.grid_size), num_objects=args.objects,
+                            sort_by=f"SORT_BY_{args.sort_by.upper()}", max_steps=args.max_steps,
+                            plan_budget=args.plan_budget, carry_capacity=args.carry_capacity)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(episodes)
+    summary["total_wall_time"] = elapsed
+
+    if args.csv:
+        write_csv(args.csv, episodes)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "episodes": episodes}, f, indent=2)
+
+    print(f"{len(episodes)} episodes in {elapsed:.2f}s ({summary['completed']} completed)")
+    for metric in METRICS:
+        if metric in summary:
+            stats = summary[metric]
+            print(f"  {metric:>13}: mean {stats['mean']:.4g}  median {stats['median']:.4g}  "
+                  f"min {stats['min']:.4g}  max {stats['max']:.4g}")
+    if args.carry_capacity > 1 and episodes:
+        baseline_steps = summary["steps"]["mean"] + summary["steps_saved"]["mean"]
+        print(f"Carrying {args.carry_capacity} objects cut steps by "
+              f"{summary['steps_saved']['mean'] / baseline_steps:.1%} against carrying one")
+
+
+if __name__ == "__main__":
+    main()
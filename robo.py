@@ -1,51 +1,673 @@
 import matplotlib
-matplotlib.use('TkAgg') 
 import matplotlib.pyplot as plt
-from transformers import pipeline
-import tkinter as tk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from PIL import Image, ImageTk
+from PIL import Image
 import matplotlib.patches as patches
+import matplotlib.transforms as transforms
 import random
 import numpy as np
 import time
-import matplotlib.image as mpimg
 import os
-from scipy import ndimage
+import threading
+import queue
+import heapq
+import re
+import json
+import sqlite3
+import functools
+import argparse
+import sys
+import hashlib
+from collections import OrderedDict, Counter, namedtuple, deque
 
+try:
+    import tkinter as tk
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from PIL import ImageTk
+except ImportError:
+    # Headless servers without Tk can still run the simulation
+    tk = None
 
-classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
 
+MODEL_NAME = "facebook/bart-large-mnli"
+CLASSIFIER_BACKENDS = ["pipeline", "quantized", "onnx", "distilled"]
+ONNX_EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.onnx_cache')
 
-SHAPES = ['circle', 'triangle', 'square']
-COLORS = ['red', 'green', 'blue']
 
+def load_classifier(model_name=MODEL_NAME, backend="pipeline"):
+    """
+    Build a zero-shot classifier on the given backend. Every backend is a
+    transformers zero-shot pipeline, so they take the same arguments and
+    return the same results:
+      pipeline   the model as published, float32 PyTorch
+      quantized  the same weights with every Linear layer dynamically quantized to int8
+      onnx       the model exported to ONNX once, into ONNX_EXPORT_DIR, and run by ONNX Runtime
+      distilled  a smaller NLI model from the local directory model_name
+    torch and optimum[onnxruntime] are only imported by the backends that need them.
+    """
+    from transformers import pipeline
+    if backend == "pipeline":
+        return pipeline("zero-shot-classification", model=model_name)
+    if backend == "distilled":
+        if not os.path.isdir(model_name):
+            raise ValueError(f"The distilled backend loads a local model directory, not {model_name!r}")
+        return pipeline("zero-shot-classification", model=model_name)
+    if backend not in CLASSIFIER_BACKENDS:
+        raise ValueError(f"Unknown classifier backend {backend!r}, expected one of {CLASSIFIER_BACKENDS}")
 
-try:
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "quantized":
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        export_dir = os.path.join(ONNX_EXPORT_DIR, re.sub(r"[^\w.-]", "_", model_name))
+        if os.path.isdir(export_dir):
+            model = ORTModelForSequenceClassification.from_pretrained(export_dir)
+        else:
+            model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+            model.save_pretrained(export_dir)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
 
-    robot_img = plt.imread('robot.png')
 
-    if robot_img.shape[2] == 4:
-      
+class ClassifierProvider:
+    """
+    Load the zero-shot classifier on first use instead of at import time, on
+    one of CLASSIFIER_BACKENDS (see load_classifier).
+    """
+    def __init__(self, model_name=MODEL_NAME, backend="pipeline"):
+        self.model_name = model_name
+        # None once a classifier is injected with set_classifier
+        self.backend = backend
+        # Names the injected classifier in cache keys while backend is None
+        self.injected_name = None
+        self.load_time = None
+        self._classifier = None
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+
+    @property
+    def is_loaded(self):
+        return self._classifier is not None
+
+    @property
+    def name(self):
+        """The model name, tagged with the backend unless it is the plain pipeline."""
+        if self.backend is None:
+            return self.injected_name
+        if self.backend == "pipeline":
+            return self.model_name
+        return f"{self.model_name}+{self.backend}"
+
+    def get(self):
+        """Return the classifier, loading it if it is not ready yet."""
+        if self._classifier is None:
+            with self._lock:
+                if self._classifier is None:
+                    start = time.perf_counter()
+                    self._classifier = load_classifier(self.model_name, self.backend)
+                    self.load_time = time.perf_counter() - start
+                    print(f"Loaded {self.name} in {self.load_time:.2f}s", file=sys.stderr)
+        return self._classifier
+
+    def set_classifier(self, classifier, model_name=None):
+        """
+        Use the given callable (e.g. a stub for headless runs) as the classifier.
+        model_name keys its cached commands; it defaults to the callable's repr,
+        so they never mix with those of a loaded model.
+        """
+        with self._lock:
+            self._classifier = classifier
+            self.backend = None
+            self.load_time = 0.0
+            self.injected_name = model_name if model_name is not None else f"injected:{classifier!r}"
+
+    def set_backend(self, backend, model_name=None):
+        """Switch to another backend (and model); it is loaded on next use."""
+        if backend not in CLASSIFIER_BACKENDS:
+            raise ValueError(f"Unknown classifier backend {backend!r}, expected one of {CLASSIFIER_BACKENDS}")
+        with self._lock:
+            self._classifier = None
+            self.backend = backend
+            self.load_time = None
+            if model_name is not None:
+                self.model_name = model_name
+
+    def warm_up(self):
+        """Start loading the classifier in a background thread."""
+        if self._classifier is None and self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self._warm_up, name="classifier-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _warm_up(self):
+        try:
+            self.get()
+        except Exception as e:
+            # get() will retry and raise in the caller on first real use
+            print(f"Warning: classifier warm-up failed: {e}", file=sys.stderr)
+
+
+classifier_provider = ClassifierProvider()
+
+
+def normalize_command(text):
+    """Normalize a command so trivial variations share a cache entry."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+class CommandCache:
+    """
+    LRU cache of interpreted commands, optionally persisted to a sqlite file.
+    Keys include the model name and label set, so changing either misses.
+    Recency updates from hits are committed at most every commit_interval
+    seconds and on close().
+    """
+    def __init__(self, maxsize=1024, path=None, commit_interval=1.0):
+        self.maxsize = maxsize
+        self.path = path
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._last_commit = time.monotonic()
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS commands "
+                             "(key TEXT PRIMARY KEY, label TEXT, scores TEXT, used REAL)")
+            rows = self._db.execute("SELECT key, label, scores FROM commands "
+                                    "ORDER BY used DESC LIMIT ?", (maxsize,)).fetchall()
+            for key, label, scores in reversed(rows):
+                self._entries[key] = (label, json.loads(scores))
+
+    @staticmethod
+    def make_key(text, model_name, labels):
+        return "\x1f".join([model_name, ",".join(labels), normalize_command(text)])
+
+    def get(self, key):
+        """Return the cached (label, scores) for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute("UPDATE commands SET used = ? WHERE key = ?", (time.time(), key))
+                if time.monotonic() - self._last_commit >= self.commit_interval:
+                    self._commit()
+            return entry
+
+    def put(self, key, label, scores):
+        """Store (label, scores) for key, evicting the least recently used entry."""
+        with self._lock:
+            self._entries[key] = (label, scores)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.maxsize:
+                evicted.append(self._entries.popitem(last=False)[0])
+
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO commands VALUES (?, ?, ?, ?)",
+                                 (key, label, json.dumps(scores), time.time()))
+                self._db.executemany("DELETE FROM commands WHERE key = ?", [(k,) for k in evicted])
+                self._commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM commands")
+                self._commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._commit()
+                self._db.close()
+                self._db = None
+
+    def _commit(self):
+        self._db.commit()
+        self._last_commit = time.monotonic()
+
+    def info(self):
+        """Return hit/miss counters and the current size."""
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+command_cache = CommandCache()
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
         pass
-    else:
-     
+
+    def __exit__(self, *exc_info):
         pass
-except FileNotFoundError:
-    robot_img = None
-    print("Warning: robot.png not found. Using circle representation instead.")
-except Exception as e:
-    robot_img = None
-    print(f"Warning: Could not load robot.png: {e}. Using circle representation instead.")
+
+
+class Profiler:
+    """
+    Per-phase call counters and latency histograms. Each histogram bucket i
+    counts calls that took less than 2**i microseconds. While disabled,
+    phase() hands out a shared no-op context so instrumented code pays for
+    little more than the call.
+    """
+    NUM_BUCKETS = 32
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def phase(self, name):
+        """Context manager timing one call of the named phase."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), self.NUM_BUCKETS - 1)
+        with self._lock:
+            stats = self._phases.get(name)
+            if stats is None:
+                stats = self._phases[name] = [0, 0.0, 0.0, [0] * self.NUM_BUCKETS]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3][bucket] += 1
+
+    def reset(self):
+        with self._lock:
+            self._phases.clear()
+
+    def summary(self):
+        """Return {phase: counters, timings in ms and the non-empty histogram buckets}."""
+        with self._lock:
+            phases = {name: (count, total, longest, list(buckets))
+                      for name, (count, total, longest, buckets) in self._phases.items()}
+
+        summary = {}
+        for name, (count, total, longest, buckets) in sorted(phases.items()):
+            summary[name] = {
+                "count": count,
+                "total_ms": total * 1e3,
+                "mean_ms": total / count * 1e3,
+                "p50_ms": min(self._percentile(buckets, count, 0.5), longest * 1e3),
+                "p95_ms": min(self._percentile(buckets, count, 0.95), longest * 1e3),
+                "max_ms": longest * 1e3,
+                "histogram_us": {f"<{2 ** i}": n for i, n in enumerate(buckets) if n},
+            }
+        return summary
+
+    @staticmethod
+    def _percentile(buckets, count, fraction):
+        """Upper bound, in ms, of the bucket holding the given fraction of the calls."""
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if seen >= fraction * count:
+                return 2 ** i / 1e3
+        return 0.0
+
+    def report(self):
+        """Format the summary as a fixed-width table."""
+        lines = [f"{'phase':<30}{'calls':>8}{'mean ms':>10}{'p95 ms':>10}{'total s':>10}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<30}{stats['count']:>8}{stats['mean_ms']:>10.3f}"
+                         f"{stats['p95_ms']:>10.3f}{stats['total_ms'] / 1e3:>10.2f}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Write the summary to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+_NULL_PHASE = _NullPhase()
+PROFILE_DUMP_PATH = "robo_profile.json"
+
+profiler = Profiler()
+
+
+def profiled(name):
+    """Decorator recording every call of the function as the named phase."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with _Phase(profiler, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+SHAPES = ['circle', 'triangle', 'square']
+COLORS = ['red', 'green', 'blue']
+
+MOVEMENT_LABELS = ["MOVE_FORWARD", "TURN_LEFT", "TURN_RIGHT"]
+SORTING_LABELS = ["SORT_BY_COLOR", "SORT_BY_SHAPE", "PICK_UP", "DROP"]
+COMMAND_LABELS = MOVEMENT_LABELS + SORTING_LABELS
+
+
+ROBOT_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'robot.png')
+SPRITE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sprite_cache')
+
+
+class SpriteCache:
+    """
+    Load the robot image once, downsample it to the on-screen size and keep the
+    exact N/E/S/W variants (lossless 90 degree rotations). With a cache_dir the
+    prepared variants are saved to disk so later startups skip the processing.
+    """
+    ORIENTATIONS = ['N', 'E', 'S', 'W']
+
+    def __init__(self, path=ROBOT_IMAGE_PATH, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self._source = None
+        self._source_failed = False
+        self._variants = {}
+
+    def get(self, orientation, pixels):
+        """Return the RGBA sprite facing orientation, pixels wide, or None without an image."""
+        variants = self._variants.get(pixels)
+        if variants is None:
+            variants = self._variants[pixels] = self._load_cached(pixels) or self._prepare(pixels)
+        return variants.get(orientation) if variants else None
+
+    def _cache_file(self, pixels):
+        stat = os.stat(self.path)
+        name = f"{os.path.splitext(os.path.basename(self.path))[0]}_{pixels}px_{stat.st_size}_{int(stat.st_mtime)}.npz"
+        return os.path.join(self.cache_dir, name)
+
+    def _load_cached(self, pixels):
+        if not self.cache_dir or not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self._cache_file(pixels)) as cached:
+                return {orientation: cached[orientation] for orientation in self.ORIENTATIONS}
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _load_source(self):
+        if self._source is None and not self._source_failed:
+            try:
+                image = Image.open(self.path).convert('RGBA')
+            except FileNotFoundError:
+                self._source_failed = True
+                print("Warning: robot.png not found. Using circle representation instead.", file=sys.stderr)
+                return None
+            except Exception as e:
+                self._source_failed = True
+                print(f"Warning: Could not load robot.png: {e}. Using circle representation instead.", file=sys.stderr)
+                return None
+
+            # Pad to a square so the 90 degree rotations keep the full image
+            side = max(image.size)
+            square = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+            square.paste(image, ((side - image.size[0]) // 2, (side - image.size[1]) // 2))
+            self._source = square
+        return self._source
+
+    def _prepare(self, pixels):
+        source = self._load_source()
+        if source is None:
+            return {}
+
+        sprite = np.asarray(source.resize((pixels, pixels), Image.LANCZOS))
+        variants = {orientation: np.ascontiguousarray(np.rot90(sprite, k))
+                    for k, orientation in enumerate(self.ORIENTATIONS)}
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.savez_compressed(self._cache_file(pixels), **variants)
+            except OSError as e:
+                print(f"Warning: Could not save robot sprites: {e}", file=sys.stderr)
+        return variants
+
+
+robot_sprites = SpriteCache(cache_dir=SPRITE_CACHE_DIR)
+
+
+def sprite_pixels(ax, grid_size):
+    """On-screen width in pixels of the robot sprite, which spans two cells."""
+    return max(16, int(round(2 * ax.bbox.width / grid_size[0])))
+
+class ObjectStore:
+    """
+    Structure-of-arrays storage for grid objects. Positions, shape and color
+    codes and the carried/sorted flags live in NumPy arrays so that queries over
+    all objects are vectorized masks; GridObject instances are views onto rows.
+    """
+    def __init__(self, capacity=16, shape_names=SHAPES, color_names=COLORS):
+        capacity = max(1, capacity)
+        self.count = 0
+        self.positions = np.zeros((capacity, 2), dtype=np.int32)
+        self.shape_codes = np.zeros(capacity, dtype=np.int16)
+        self.color_codes = np.zeros(capacity, dtype=np.int16)
+        self.carried = np.zeros(capacity, dtype=bool)
+        self.sorted = np.zeros(capacity, dtype=bool)
+        self.shape_names = list(shape_names)
+        self.color_names = list(color_names)
+        self._views = []
+
+    @classmethod
+    def from_objects(cls, grid_objects):
+        """
+        Return the store backing grid_objects, in list order. Objects from other
+        stores (or several stores) are moved into a new one.
+        """
+        grid_objects = list(grid_objects)
+        if grid_objects:
+            store = grid_objects[0]._store
+            if store.count == len(grid_objects) and all(
+                    obj._store is store and obj._index == i for i, obj in enumerate(grid_objects)):
+                return store
+
+        store = cls(capacity=len(grid_objects))
+        for obj in grid_objects:
+            store.adopt(obj)
+        return store
+
+    def add(self, shape, color, position):
+        """Append a new object and return its GridObject view."""
+        return GridObject(shape, color, position, store=self)
+
+    def extend(self, shape_codes, color_codes, positions):
+        """Append many objects from code and (n, 2) position arrays at once; returns their views."""
+        start, count = self.count, len(positions)
+        if start + count > len(self.carried):
+            self._grow(max(2 * self.count, start + count))
+        end = start + count
+        self.positions[start:end] = positions
+        self.shape_codes[start:end] = shape_codes
+        self.color_codes[start:end] = color_codes
+        self.carried[start:end] = False
+        self.sorted[start:end] = False
+        views = []
+        for i in range(start, end):
+            obj = GridObject.__new__(GridObject)
+            obj._store = self
+            obj._index = i
+            views.append(obj)
+        self._views.extend(views)
+        self.count = end
+        return views
+
+    def adopt(self, obj):
+        """Move obj's data into this store and rebind the view to it."""
+        is_carried, is_properly_sorted = obj.is_carried, obj.is_properly_sorted
+        self._append(obj, obj.shape, obj.color, obj.position)
+        obj.is_carried = is_carried
+        obj.is_properly_sorted = is_properly_sorted
+
+    def view(self, index):
+        return self._views[index]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def copy(self):
+        """Return a view-less copy of the arrays, e.g. for a snapshot."""
+        store = ObjectStore(self.count, self.shape_names, self.color_names)
+        store.count = self.count
+        store.positions[:self.count] = self.positions[:self.count]
+        store.shape_codes[:self.count] = self.shape_codes[:self.count]
+        store.color_codes[:self.count] = self.color_codes[:self.count]
+        store.carried[:self.count] = self.carried[:self.count]
+        store.sorted[:self.count] = self.sorted[:self.count]
+        return store
+
+    def shape_code(self, shape):
+        if shape not in self.shape_names:
+            self.shape_names.append(shape)
+        return self.shape_names.index(shape)
+
+    def color_code(self, color):
+        if color not in self.color_names:
+            self.color_names.append(color)
+        return self.color_names.index(color)
+
+    def available_mask(self):
+        """Objects lying on the grid that are not properly sorted yet."""
+        return ~self.carried[:self.count] & ~self.sorted[:self.count]
+
+    def on_grid_mask(self):
+        return ~self.carried[:self.count]
+
+    def matching_mask(self, area):
+        """Objects that belong in the given SortingArea."""
+        if area.category_type == 'color':
+            names, codes = self.color_names, self.color_codes
+        elif area.category_type == 'shape':
+            names, codes = self.shape_names, self.shape_codes
+        else:
+            return np.zeros(self.count, dtype=bool)
+        if area.category_value not in names:
+            return np.zeros(self.count, dtype=bool)
+        return codes[:self.count] == names.index(area.category_value)
+
+    def count_sorted(self):
+        return int(np.count_nonzero(self.sorted[:self.count]))
+
+    def _append(self, obj, shape, color, position):
+        if self.count == len(self.carried):
+            self._grow(2 * self.count)
+        i = self.count
+        self.positions[i] = position
+        self.shape_codes[i] = self.shape_code(shape)
+        self.color_codes[i] = self.color_code(color)
+        self.carried[i] = False
+        self.sorted[i] = False
+        obj._store = self
+        obj._index = i
+        self._views.append(obj)
+        self.count += 1
+
+    def _grow(self, capacity):
+        for name in ('positions', 'shape_codes', 'color_codes', 'carried', 'sorted'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
 
 class GridObject:
-    """Class to represent objects on the grid."""
-    def __init__(self, shape, color, position):
-        self.shape = shape
-        self.color = color
-        self.position = position  
-        self.is_carried = False
-        self.is_properly_sorted = False 
+    """Class to represent objects on the grid, as a view onto one row of an ObjectStore."""
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, shape, color, position, store=None):
+        if store is None:
+            store = ObjectStore(capacity=1)
+        store._append(self, shape, color, position)
+
+    @property
+    def index(self):
+        """Row of this object in its store."""
+        return self._index
+
+    @property
+    def shape(self):
+        return self._store.shape_names[self._store.shape_codes[self._index]]
+
+    @shape.setter
+    def shape(self, shape):
+        self._store.shape_codes[self._index] = self._store.shape_code(shape)
+
+    @property
+    def color(self):
+        return self._store.color_names[self._store.color_codes[self._index]]
+
+    @color.setter
+    def color(self, color):
+        self._store.color_codes[self._index] = self._store.color_code(color)
+
+    @property
+    def position(self):
+        x, y = self._store.positions[self._index]
+        return (int(x), int(y))
+
+    @position.setter
+    def position(self, position):
+        self._store.positions[self._index] = position
+
+    @property
+    def is_carried(self):
+        return bool(self._store.carried[self._index])
+
+    @is_carried.setter
+    def is_carried(self, value):
+        self._store.carried[self._index] = value
+
+    @property
+    def is_properly_sorted(self):
+        return bool(self._store.sorted[self._index])
+
+    @is_properly_sorted.setter
+    def is_properly_sorted(self, value):
+        self._store.sorted[self._index] = value
+
+    def __repr__(self):
+        return f"GridObject({self.shape!r}, {self.color!r}, {self.position})"
 
     def draw(self, ax):
         """Draw the object on the given axes."""
@@ -74,7 +696,13 @@ class SortingArea:
         self.category_value = category_value 
         self.position = position 
         self.size = size 
-        
+        self.slots = None
+
+    def track_slots(self, world):
+        """Start keeping a FreeSlots of this area, synced from world (a WorldIndex)."""
+        self.slots = FreeSlots(self.position, self.size, world.occupancy)
+        return self.slots
+
     def contains_position(self, position):
         """Check if a position is within this sorting area."""
         x, y = position
@@ -111,244 +739,482 @@ class SortingArea:
         ax.text(x + width/2, y + height/2, label_text,
                 ha='center', va='center', fontsize=18, fontweight='bold')
 
-def generate_random_objects(num_objects, grid_size, sorting_areas):
-    """Generate random objects on the grid, avoiding sorting areas for initial placement."""
-    objects = []
-    positions = set()
-    
-    # Define positions to avoid (robot's initial position and sorting areas)
-    forbidden_positions = {(0, 0)}  
+def _ring_cells(x0, y0, x1, y1):
+    """The cells on the border of the rectangle (x0, y0)-(x1, y1), in order around it."""
+    if x0 == x1 or y0 == y1:
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+    return ([(x, y0) for x in range(x0, x1)] + [(x1, y) for y in range(y0, y1)] +
+            [(x, y1) for x in range(x1, x0, -1)] + [(x0, y) for y in range(y1, y0, -1)])
+
+class FreeSlots:
+    """
+    The free cells of a sorting area, as concentric rings. Cells are handed
+    out innermost ring first: while a ring is filling, every ring around it
+    is still empty, so the free cells always connect to the area's edge and
+    none gets walled in. Within the ring, the free cell nearest to the
+    approach point is found by projecting the point onto the ring and
+    following skip links around it in both directions, so a lookup takes
+    near constant time however large the area. Emptying a cell resets its
+    ring's links, which only happens when an object is taken back out; a
+    cell emptied inside a ring that still holds objects stays closed until
+    the rings around it are empty again, as do free cells already enclosed
+    when the area is set up. A side flush with the grid's edge cannot be
+    reached from, so the rings are laid out as if the area went on past it
+    for as far again; their cells off the grid are never free.
+    """
+    def __init__(self, position, size, occupied):
+        x, y = position
+        width, height = size
+        self.position = position
+        self.size = size
+        grid_width, grid_height = occupied.shape
+        x0 = x - width if x == 0 else x
+        y0 = y - height if y == 0 else y
+        x1 = x + 2 * width - 1 if x + width == grid_width else x + width - 1
+        y1 = y + 2 * height - 1 if y + height == grid_height else y + height - 1
+        self.bounds = []
+        self.rings = []
+        self.where = {}
+        for depth in range((min(x1 - x0, y1 - y0) + 2) // 2):
+            bounds = (x0 + depth, y0 + depth, x1 - depth, y1 - depth)
+            ring = _ring_cells(*bounds)
+            for i, cell in enumerate(ring):
+                self.where[cell] = (depth, i)
+            self.bounds.append(bounds)
+            self.rings.append(ring)
+        on_grid = [[0 <= cx < grid_width and 0 <= cy < grid_height for cx, cy in ring]
+                   for ring in self.rings]
+        # The cells of each ring that lie on the grid
+        self.sizes = [sum(flags) for flags in on_grid]
+        self.free = [[inside and not occupied[cell] for cell, inside in zip(ring, flags)]
+                     for ring, flags in zip(self.rings, on_grid)]
+        self.free_counts = [sum(flags) for flags in self.free]
+        self.count = sum(self.free_counts)
+        # _links[ring][0][i] and [1][i]: the next cell forwards and backwards around the
+        # ring that may be free; runs of full cells get skipped as lookups pass over them
+        self._links = [self._fresh_links(len(ring)) for ring in self.rings]
+        self._open_ring()
+        # Which cells of the area the slots last saw filled, to diff the world against
+        self.filled = occupied[x:x + width, y:y + height].copy()
+
+    @staticmethod
+    def _fresh_links(n):
+        return [(i + 1) % n for i in range(n)], [(i - 1) % n for i in range(n)]
+
+    def _skip_full_rings(self):
+        while self.innermost >= 0 and not self.free_counts[self.innermost]:
+            self.innermost -= 1
+
+    def _open_ring(self):
+        """
+        Fill the outermost ring holding objects while it has room, then the
+        empty ring around it; rings inside it are closed until it empties.
+        """
+        depth = 0
+        while depth < len(self.rings) and self.free_counts[depth] == self.sizes[depth]:
+            depth += 1
+        if depth < len(self.rings) and self.free_counts[depth]:
+            self.innermost = depth
+        else:
+            self.innermost = depth - 1
+
+    def update(self, cell, occupied):
+        """Record that cell was filled or emptied. Cells outside the area are ignored."""
+        where = self.where.get(cell)
+        if where is None:
+            return
+        ring, i = where
+        if self.free[ring][i] != bool(occupied):
+            return
+        self.free[ring][i] = not occupied
+        self.filled[cell[0] - self.position[0], cell[1] - self.position[1]] = occupied
+        change = -1 if occupied else 1
+        self.free_counts[ring] += change
+        self.count += change
+        if occupied:
+            self._skip_full_rings()
+        else:
+            self._links[ring] = self._fresh_links(len(self.rings[ring]))
+            self._open_ring()
+
+    def copy(self):
+        """An independent copy to hand out cells from, e.g. to try a drop order."""
+        slots = object.__new__(FreeSlots)
+        slots.__dict__.update(self.__dict__)
+        slots.free = [flags[:] for flags in self.free]
+        slots.free_counts = self.free_counts[:]
+        slots.filled = self.filled.copy()
+        slots._links = [(forward[:], backward[:]) for forward, backward in self._links]
+        return slots
+
+    def upcoming(self, count):
+        """The free cells the next `count` fills can land on: those of the rings they reach."""
+        cells = []
+        ring = self.innermost
+        while ring >= 0 and count > 0:
+            cells.extend(cell for cell, free in zip(self.rings[ring], self.free[ring]) if free)
+            count -= self.free_counts[ring]
+            ring -= 1
+        return cells
+
+    def sync(self, world):
+        """Apply the cells of the area whose occupancy in world (a WorldIndex) changed since the last sync."""
+        x, y = self.position
+        width, height = self.size
+        occupancy = world.occupancy[x:x + width, y:y + height]
+        for dx, dy in np.argwhere(occupancy != self.filled).tolist():
+            self.update((x + dx, y + dy), occupancy[dx, dy])
+
+    def nearest(self, approach):
+        """The free cell to fill next, nearest to approach in its ring, or None when the area is full."""
+        ring = self.innermost
+        if ring < 0:
+            return None
+        x0, y0, x1, y1 = self.bounds[ring]
+        px, py = approach
+        cx, cy = min(max(px, x0), x1), min(max(py, y0), y1)
+        if x0 < cx < x1 and y0 < cy < y1:
+            # Inside the ring: start from its closest side
+            cx, cy = min(((x0, cy), (x1, cy), (cx, y0), (cx, y1)),
+                         key=lambda cell: abs(cell[0] - px) + abs(cell[1] - py))
+        start = self.where[(cx, cy)][1]
+        cells = self.rings[ring]
+        forward, backward = (cells[self._find_free(ring, direction, start)] for direction in (0, 1))
+        return min(forward, backward, key=lambda cell: abs(cell[0] - px) + abs(cell[1] - py))
+
+    def _find_free(self, ring, direction, i):
+        free = self.free[ring]
+        links = self._links[ring][direction]
+        while not free[i]:
+            j = links[i]
+            if not free[j]:
+                # Point past the next full cell too, so later lookups skip the whole run
+                links[i] = links[j]
+            i = j
+        return i
+
+def generate_random_objects(num_objects, grid_size, sorting_areas, shapes=SHAPES, colors=COLORS):
+    """
+    Generate random objects on the grid, avoiding the robot's start cell and the sorting areas.
+    Every shape and every color appears at least once when there are enough
+    objects, combinations stay distinct while there are unused ones, and any
+    further objects repeat combinations. Positions are drawn without
+    replacement from the array of free cells, so nothing is retried. Randomness
+    comes from the `random` module's state, so random.seed reproduces a layout.
+    Raises ValueError when there are fewer free cells than objects.
+    """
+    free = np.ones(grid_size, dtype=bool)
+    free[0, 0] = False
     for area in sorting_areas:
-        for x in range(area.position[0], area.position[0] + area.size[0]):
-            for y in range(area.position[1], area.position[1] + area.size[1]):
-                forbidden_positions.add((x, y))
-    
-    # Create a list of all possible shape-color combinations
-    all_combinations = [(shape, color) for shape in SHAPES for color in COLORS]
-    
-    # Ensure at least one of each color and one of each shape
-    required_combinations = []
-    colors_used = set()
-    shapes_used = set()
-    
-    # First, ensure we have at least one of each shape
-    for shape in SHAPES:
-        if shape not in shapes_used:
-            # Pick a random color for this shape that hasn't been used if possible
-            available_colors = [c for c in COLORS if c not in colors_used] or COLORS
-            selected_color = random.choice(available_colors)
-            required_combinations.append((shape, selected_color))
-            shapes_used.add(shape)
-            colors_used.add(selected_color)
-    
-    # Then, ensure we have at least one of each color
-    for color in COLORS:
-        if color not in colors_used:
-            # Pick a random shape for this color that creates a unique combination
-            available_shapes = [s for s in SHAPES 
-                               if (s, color) not in required_combinations]
-            if available_shapes:
-                selected_shape = random.choice(available_shapes)
-                required_combinations.append((selected_shape, color))
-                shapes_used.add(selected_shape)
-                colors_used.add(color)
-    
-    # Calculate how many additional random combinations we need
-    remaining_slots = max(0, num_objects - len(required_combinations))
-    
-    # Get remaining combinations that aren't already required
-    remaining_combinations = [(s, c) for s, c in all_combinations 
-                             if (s, c) not in required_combinations]
-    
-    # Select random additional combinations if needed
-    selected_combinations = required_combinations.copy()
-    if remaining_slots > 0 and remaining_combinations:
-        additional_combinations = random.sample(
-            remaining_combinations, 
-            min(remaining_slots, len(remaining_combinations))
-        )
-        selected_combinations.extend(additional_combinations)
-    
-    # Create objects for each selected combination
-    for shape, color in selected_combinations:
-        # Try to find a valid position
-        for _ in range(100):  # Limit attempts to prevent infinite loop
-            x = random.randint(0, grid_size[0] - 1)
-            y = random.randint(0, grid_size[1] - 1)
-            
-            if (x, y) not in positions and (x, y) not in forbidden_positions:
-                positions.add((x, y))
-                objects.append(GridObject(shape, color, (x, y)))
-                break
-    
-    return objects
+        x, y = area.position
+        width, height = area.size
+        free[x:x + width, y:y + height] = False
+    free_cells = np.flatnonzero(free)
+    if num_objects > len(free_cells):
+        raise ValueError(f"{num_objects} objects do not fit in the {len(free_cells)} free cells")
 
-def create_sorting_areas(grid_size, sort_by):
-    """Create the designated sorting areas based on sort criteria."""
-    areas = []
-    
+    rng = np.random.default_rng(random.getrandbits(64))
+    num_shapes, num_colors = len(shapes), len(colors)
+    num_combinations = num_shapes * num_colors
+
+    # Pair shuffled shapes and colors so that the first objects cover all of both
+    shape_order = rng.permutation(num_shapes)
+    color_order = rng.permutation(num_colors)
+    covering = np.arange(max(num_shapes, num_colors))
+    required = shape_order[covering % num_shapes] * num_colors + color_order[covering % num_colors]
+
+    unused = np.setdiff1d(np.arange(num_combinations), required)
+    num_distinct = min(max(0, num_objects - len(required)), len(unused))
+    num_repeated = max(0, num_objects - len(required) - num_distinct)
+    combinations = np.concatenate([required, rng.choice(unused, num_distinct, replace=False),
+                                   rng.integers(0, num_combinations, num_repeated)])[:num_objects]
+
+    cells = rng.choice(free_cells, len(combinations), replace=False)
+    positions = np.column_stack(np.divmod(cells, grid_size[1]))
+
+    store = ObjectStore(capacity=len(combinations), shape_names=shapes, color_names=colors)
+    return store.extend(combinations // num_colors, combinations % num_colors, positions)
+
+def create_sorting_areas(grid_size, sort_by, categories=None, capacity=9):
+    """
+    Create the designated sorting areas based on sort criteria.
+    There is one area per category (COLORS or SHAPES unless given), each a
+    square holding at least `capacity` objects and at least 3x3. Areas are
+    tiled in rows from (2, 2) with a one-cell gap, wrapping to a new row at the
+    grid's edge. Raises ValueError when they do not fit.
+    """
     if sort_by == "SORT_BY_COLOR":
-       
-        area_width, area_height = 3, 3
-        
-       
-        for i, color in enumerate(COLORS):
-            x_start = 2 + i * (area_width + 1)
-            y_start = 2
-            areas.append(SortingArea('color', color, (x_start, y_start), (area_width, area_height)))
-    
+        category_type, categories = 'color', categories or COLORS
     elif sort_by == "SORT_BY_SHAPE":
-       
-        area_width, area_height = 3, 3
-        
-      
-        for i, shape in enumerate(SHAPES):
-            x_start = 2 + i * (area_width + 1)
-            y_start = 2
-            areas.append(SortingArea('shape', shape, (x_start, y_start), (area_width, area_height)))
-    
-    return areas
+        category_type, categories = 'shape', categories or SHAPES
+    else:
+        return []
+
+    side = max(3, int(np.ceil(np.sqrt(capacity))))
+    tiles = _area_tiles(grid_size, side)
+    if len(tiles) < len(categories):
+        raise ValueError(f"{len(categories)} sorting areas of {side}x{side} do not fit in a "
+                         f"{grid_size[0]}x{grid_size[1]} grid")
+    return [SortingArea(category_type, category, position, (side, side))
+            for category, position in zip(categories, tiles)]
+
+def _area_tiles(grid_size, side):
+    """Positions of side x side areas tiled in rows from (2, 2) with a one-cell gap."""
+    pitch = side + 1
+    per_row = max(0, (grid_size[0] - side - 2) // pitch + 1)
+    rows = max(0, (grid_size[1] - side - 2) // pitch + 1)
+    return [(2 + column * pitch, 2 + row * pitch) for row in range(rows) for column in range(per_row)]
+
+def _free_area_tiles(grid_size, size, sorting_areas):
+    """The tiles for size areas, in tiling order, that overlap none of sorting_areas."""
+    width, height = size
+    for x, y in _area_tiles(grid_size, width):
+        if not any(x < other.position[0] + other.size[0] and other.position[0] < x + width and
+                   y < other.position[1] + other.size[1] and other.position[1] < y + height
+                   for other in sorting_areas):
+            yield x, y
+
+def _carrying_label(inventory):
+    """Text listing the carried objects, the one picked up last first."""
+    return "Carrying: " + ", ".join(f"{obj.color} {obj.shape}" for obj in reversed(inventory))
 
-def draw_grid(robot_pos, robot_orientation, fig, ax, grid_objects, sorting_areas, carried_object, status_message, grid_size=(10, 10)):
+def _decide_command(result):
     """
-    Draw the grid, robot, sorting areas, and objects on the grid.
+    Turn one classification over COMMAND_LABELS into (label, scores).
+    The pipeline softmaxes over all candidate labels, so renormalizing each
+    group gives the same scores as classifying the groups separately.
     """
-    ax.clear()
-    ax.set_xlim(0, grid_size[0])
-    ax.set_ylim(0, grid_size[1])
-    ax.set_facecolor('white')
-    ax.grid(False)
-    ax.set_xlabel('X-axis', fontsize=14)
-    ax.set_ylabel('Y-axis', fontsize=14)
-    ax.set_title('Robot Grid Environment', fontsize=18)
-    
-
-    for area in sorting_areas:
-        area.draw(ax)
-    
+    raw_scores = dict(zip(result["labels"], result["scores"]))
+    scores = {}
+    for group in (MOVEMENT_LABELS, SORTING_LABELS):
+        total = sum(raw_scores[label] for label in group) or 1.0
+        for label in group:
+            scores[label] = raw_scores[label] / total
 
-    for obj in grid_objects:
-        obj.draw(ax)
-    
-    x, y = robot_pos
-    
+    movement_label = max(MOVEMENT_LABELS, key=scores.get)
+    sorting_label = max(SORTING_LABELS, key=scores.get)
 
-    # Get the robot color based on whether it's carrying an object
-    robot_color = 'blue'
-    if carried_object:
-        robot_color = carried_object.color
-    
-    # Decide whether to use the image or fallback to a circle
-    if robot_img is not None:
-        # Calculate the rotation angle based on orientation
-        angle = 0
-        if robot_orientation == 'N':
-            angle = 0
-        elif robot_orientation == 'E':
-            angle = 90
-        elif robot_orientation == 'S':
-            angle = 180
-        elif robot_orientation == 'W':
-            angle = 270
-        
-        # Calculate the extent of the image (width and height increased by 3x)
-        img_extent = [x - 0.5, x + 1.5, y - 0.5, y + 1.5]
-        
-        # Display the robot image with rotation
-        rotated_img = ndimage.rotate(robot_img, angle, reshape=False)
-        ax.imshow(rotated_img, extent=img_extent, zorder=10)
-        
-        # If the robot is carrying an object, add an indicator matching the object's shape
-        if carried_object:
-            # Create an indicator with the same shape as the carried object
-            if carried_object.shape == 'circle':
-                indicator = patches.Circle((x + 0.5, y + 0.5), radius=0.6, 
-                                         fc=carried_object.color, ec='black', zorder=11, alpha=0.7)
-            elif carried_object.shape == 'triangle':
-                indicator = patches.RegularPolygon((x + 0.5, y + 0.5), numVertices=3, radius=0.6, 
-                                                 fc=carried_object.color, ec='black', zorder=11, alpha=0.7)
-            elif carried_object.shape == 'square':
-                indicator = patches.Rectangle((x + 0.2, y + 0.2), 0.6, 0.6, 
-                                            fc=carried_object.color, ec='black', zorder=11, alpha=0.7)
-            ax.add_patch(indicator)
+    # Determine which category had the highest confidence
+    if scores[sorting_label] > scores[movement_label]:
+        return sorting_label, scores
     else:
-        # Fallback to circle representation for the robot
-        robot = patches.Circle((x + 0.5, y + 0.5), radius=0.9, fc=robot_color, ec='black', lw=3)
-        ax.add_patch(robot)
-        
-        # Draw arrow to indicate orientation
-        dx, dy = 0, 0
-        if robot_orientation == 'N':
-            dx, dy = 0, 0.9
-        elif robot_orientation == 'E':
-            dx, dy = 0.9, 0
-        elif robot_orientation == 'S':
-            dx, dy = 0, -0.9
-        elif robot_orientation == 'W':
-            dx, dy = -0.9, 0
-        
-        ax.arrow(x + 0.5, y + 0.5, dx, dy, head_width=0.3, head_length=0.3, fc='white', ec='black', lw=2)
-        
-        # If the robot is carrying an object, represent it with the proper shape
-        if carried_object:
-            # Position the indicator slightly in front of the robot based on orientation
-            indicator_x, indicator_y = x + 0.5, y + 0.5
-            if robot_orientation == 'N':
-                indicator_y += 0.4
-            elif robot_orientation == 'E':
-                indicator_x += 0.4
-            elif robot_orientation == 'S':
-                indicator_y -= 0.4
-            elif robot_orientation == 'W':
-                indicator_x -= 0.4
-                
-            # Create an indicator with the same shape as the carried object
-            if carried_object.shape == 'circle':
-                indicator = patches.Circle((indicator_x, indicator_y), radius=0.6, 
-                                         fc=carried_object.color, ec='black', zorder=11, alpha=0.7)
-            elif carried_object.shape == 'triangle':
-                indicator = patches.RegularPolygon((indicator_x, indicator_y), numVertices=3, radius=0.6, 
-                                                 fc=carried_object.color, ec='black', zorder=11, alpha=0.7)
-            elif carried_object.shape == 'square':
-                indicator = patches.Rectangle((indicator_x - 0.3, indicator_y - 0.3), 0.6, 0.6, 
-                                            fc=carried_object.color, ec='black', zorder=11, alpha=0.7)
-            ax.add_patch(indicator)
-    
-    if carried_object:
-        carried_text = f"Carrying: {carried_object.color} {carried_object.shape}"
-        ax.text(0.5, grid_size[1] - 0.5, carried_text, 
-                horizontalalignment='center', verticalalignment='center',
-                bbox=dict(facecolor='white', alpha=0.7),
-                fontsize=16)
-    
+        return movement_label, scores
 
-    if status_message:
-        ax.text(grid_size[0] / 2, -0.5, status_message,
-                horizontalalignment='center', verticalalignment='center',
-                bbox=dict(facecolor='lightblue', alpha=0.7),
-                fontsize=16)
-    
-    fig.canvas.draw_idle()
-    fig.canvas.flush_events()  
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+PROTOTYPE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.prototype_cache')
+
+# Example phrasings per label; their embeddings are the labels' prototypes
+INTENT_EXAMPLES = {
+    "MOVE_FORWARD": ["move forward", "go ahead", "take a step forward", "drive straight on",
+                     "advance one cell", "keep going"],
+    "TURN_LEFT": ["turn left", "rotate to the left", "face left", "spin counterclockwise",
+                  "make a left turn"],
+    "TURN_RIGHT": ["turn right", "rotate to the right", "face right", "spin clockwise",
+                   "make a right turn"],
+    "SORT_BY_COLOR": ["sort objects by color", "group the items by colour", "arrange things by their hue",
+                      "put the red, green and blue ones together", "organize everything by color"],
+    "SORT_BY_SHAPE": ["sort objects by shape", "group the items by form", "arrange things by their shape",
+                      "put the circles, squares and triangles together", "organize everything by shape"],
+    "PICK_UP": ["pick up this object", "grab it", "lift the item", "take the object in front of you",
+                "collect that"],
+    "DROP": ["drop the object", "put it down", "release it", "let it go", "place the item here"],
+}
+
+
+class EmbeddingIntentClassifier:
+    """
+    Intent engine that encodes each command once with a sentence encoder and
+    scores every label by the cosine similarity to its closest example
+    phrasing in `examples`. The example embeddings are computed once and kept
+    in cache_dir, keyed by the encoder and the examples, so later startups
+    only load them. classify returns None for commands whose best score is
+    below threshold; classify_commands hands those to the zero-shot model.
+    """
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, examples=INTENT_EXAMPLES, threshold=0.6,
+                 cache_dir=PROTOTYPE_CACHE_DIR, encoder=None):
+        self.model_name = model_name
+        self.examples = examples
+        self.threshold = threshold
+        self.cache_dir = cache_dir
+        self.labels = [label for label in COMMAND_LABELS if examples.get(label)]
+        self._encoder = encoder
+        self._prototypes = None
+        self._lock = threading.Lock()
+
+    def encode(self, texts):
+        """Unit-length embeddings of texts, one row each."""
+        if self._encoder is None:
+            with self._lock:
+                if self._encoder is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._encoder = SentenceTransformer(self.model_name)
+        vectors = np.asarray(self._encoder.encode(list(texts)), dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def prototypes(self):
+        """Return (label index per example, example embeddings), from cache_dir or computed once."""
+        if self._prototypes is None:
+            self._prototypes = self._load_cached() or self._compute()
+        return self._prototypes
+
+    def _cache_file(self):
+        key = json.dumps([self.model_name, {label: self.examples[label] for label in self.labels}])
+        return os.path.join(self.cache_dir, f"prototypes_{hashlib.sha1(key.encode()).hexdigest()[:16]}.npz")
+
+    def _load_cached(self):
+        if not self.cache_dir:
+            return None
+        try:
+            with np.load(self._cache_file()) as cached:
+                return cached["label_ids"], cached["embeddings"]
+        except (OSError, KeyError, ValueError):
+            return None
 
+    def _compute(self):
+        texts = [text for label in self.labels for text in self.examples[label]]
+        label_ids = np.array([i for i, label in enumerate(self.labels) for _ in self.examples[label]])
+        embeddings = self.encode(texts)
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.savez(self._cache_file(), label_ids=label_ids, embeddings=embeddings)
+            except OSError as e:
+                print(f"Warning: Could not save intent prototypes: {e}", file=sys.stderr)
+        return label_ids, embeddings
+
+    def classify(self, texts):
+        """
+        Return an Interpretation per text, scoring each label by its best
+        similarity, or None where the top score is below threshold.
+        """
+        label_ids, prototypes = self.prototypes()
+        similarity = self.encode(texts) @ prototypes.T
+        scores = np.stack([similarity[:, label_ids == i].max(axis=1) for i in range(len(self.labels))], axis=1)
+        results = []
+        for row in scores:
+            best = int(np.argmax(row))
+            if row[best] < self.threshold:
+                results.append(None)
+            else:
+                results.append(Interpretation(self.labels[best], dict(zip(self.labels, row.tolist())),
+                                              "embedding"))
+        return results
+
+# Keyword rules that resolve unambiguous commands without the model
+COMMAND_RULES = [
+    ("MOVE_FORWARD", re.compile(r"\b(move|go|step|drive|walk|head)( straight)? (forwards?|ahead|straight)\b|^forwards?$")),
+    ("TURN_LEFT", re.compile(r"\b(turn|rotate|face)( to( the)?)? left\b|^left$")),
+    ("TURN_RIGHT", re.compile(r"\b(turn|rotate|face)( to( the)?)? right\b|^right$")),
+    ("SORT_BY_COLOR", re.compile(r"\b(sort|group|organi[sz]e|arrange)\b.*\bcolou?rs?\b|^by colou?rs?$")),
+    ("SORT_BY_SHAPE", re.compile(r"\b(sort|group|organi[sz]e|arrange)\b.*\bshapes?\b|^by shapes?$")),
+    ("PICK_UP", re.compile(r"\bpick( \w+)? up\b|\b(grab|lift)\b")),
+    ("DROP", re.compile(r"\b(drop|release)\b|\bput( \w+)*? down\b|\blet go\b")),
+]
+# Bare keywords of each label: a command that matches one rule but also names
+# another label's keyword (e.g. "turn right then left") is left to the model
+COMMAND_KEYWORDS = {
+    "MOVE_FORWARD": re.compile(r"\b(forwards?|ahead)\b"),
+    "TURN_LEFT": re.compile(r"\bleft\b"),
+    "TURN_RIGHT": re.compile(r"\bright\b"),
+    "SORT_BY_COLOR": re.compile(r"\bcolou?rs?\b"),
+    "SORT_BY_SHAPE": re.compile(r"\bshapes?\b"),
+    "PICK_UP": re.compile(r"\b(pick|grab|lift)\b"),
+    "DROP": re.compile(r"\b(drop|release|let go)\b"),
+}
+NEGATION_PATTERN = re.compile(r"\b(not|dont|don t|never|no|stop|cancel|undo)\b")
+
+Interpretation = namedtuple("Interpretation", ["label", "scores", "source"])
+
+# How many commands were resolved by each path ("rule", "cache", "embedding", "model")
+interpretation_counts = Counter()
+
+# Set to an EmbeddingIntentClassifier to try it before the zero-shot classifier
+intent_engine = None
+
+
+def match_command_rule(user_command):
+    """
+    Return the label when exactly one keyword rule matches the command and
+    it names no other label's keyword, or None when the model should decide.
+    """
+    text = normalize_command(user_command)
+    if not text or NEGATION_PATTERN.search(text):
+        return None
+
+    matched = [label for label, pattern in COMMAND_RULES if pattern.search(text)]
+    if len(matched) != 1:
+        return None
+    label = matched[0]
+    if any(pattern.search(text) for other, pattern in COMMAND_KEYWORDS.items() if other != label):
+        return None
+    return label
+
+def _command_cache_key(user_command):
+    return CommandCache.make_key(user_command, classifier_provider.name, COMMAND_LABELS)
+
+def classify_command(user_command):
+    """
+    Convert a command into an Interpretation, trying the keyword rules, the
+    cache and the intent engine (when one is set) before the zero-shot
+    classifier. `source` says which path was used.
+    """
+    return classify_commands([user_command], batch_size=1)[0]
+
+def classify_commands(user_commands, batch_size=8):
+    """Classify a list of commands, feeding the ones that need the model in batches."""
+    user_commands = list(user_commands)
+    results = [None] * len(user_commands)
+
+    # Only the distinct commands that are neither rule-matched nor cached go through the model
+    pending = OrderedDict()
+    for i, text in enumerate(user_commands):
+        label = match_command_rule(text)
+        if label is not None:
+            results[i] = Interpretation(label, {label: 1.0}, "rule")
+            continue
+
+        key = _command_cache_key(text)
+        cached = command_cache.get(key)
+        if cached is not None:
+            results[i] = Interpretation(cached[0], cached[1], "cache")
+        else:
+            pending.setdefault(key, []).append(i)
+
+    if pending and intent_engine is not None:
+        texts = [user_commands[indices[0]] for indices in pending.values()]
+        for key, result in zip(list(pending), intent_engine.classify(texts)):
+            if result is not None:
+                for i in pending.pop(key):
+                    results[i] = result
+
+    if pending:
+        classifier = classifier_provider.get()
+        texts = [user_commands[indices[0]] for indices in pending.values()]
+        if len(texts) == 1:
+            outputs = [classifier(texts[0], COMMAND_LABELS)]
+        else:
+            outputs = classifier(texts, COMMAND_LABELS, batch_size=batch_size)
+        for (key, indices), output in zip(pending.items(), outputs):
+            label, scores = _decide_command(output)
+            command_cache.put(key, label, scores)
+            for i in indices:
+                results[i] = Interpretation(label, scores, "model")
+
+    interpretation_counts.update(result.source for result in results)
+    return results
+
+@profiled("interpret_command")
 def interpret_command(user_command):
     """
     Use the zero-shot classifier to convert the user's natural language command
     into one of the defined structured commands.
     """
-    # For movement commands
-    movement_labels = ["MOVE_FORWARD", "TURN_LEFT", "TURN_RIGHT"]
-    movement_result = classifier(user_command, movement_labels)
-    
-    # For sorting commands
-    sorting_labels = ["SORT_BY_COLOR", "SORT_BY_SHAPE", "PICK_UP", "DROP"]
-    sorting_result = classifier(user_command, sorting_labels)
-    
-    # Determine which category had the highest confidence
-    if sorting_result["scores"][0] > movement_result["scores"][0]:
-        return sorting_result["labels"][0]
-    else:
-        return movement_result["labels"][0]
+    return classify_command(user_command).label
+
+@profiled("interpret_commands")
+def interpret_commands(user_commands, batch_size=8):
+    """Interpret a list of commands, feeding them to the classifier in batches."""
+    return [result.label for result in classify_commands(user_commands, batch_size)]
 
 def update_robot_state(robot_pos, robot_orientation, command, grid_size=(10, 10)):
     """Update the robot's state based on the interpreted command."""
@@ -372,91 +1238,727 @@ def update_robot_state(robot_pos, robot_orientation, command, grid_size=(10, 10)
     
     return (x, y), robot_orientation
 
-def find_path(start_pos, target_pos, grid_objects, grid_size):
+def build_occupancy(grid_objects, grid_size):
+    """Return a boolean (width, height) array marking cells holding an object on the grid."""
+    occupied = np.zeros(grid_size, dtype=bool)
+    for obj in grid_objects:
+        if not obj.is_carried:
+            occupied[obj.position] = True
+    return occupied
+
+# find_path and the robot's own path searches all go through astar
+@profiled("find_path")
+def astar(start_pos, target_pos, occupied, grid_size):
     """
-    Find a path from start_pos to target_pos avoiding objects.
-    Returns a list of positions to visit.
+    A* over a boolean occupancy array, using a binary heap for the open list and
+    flat arrays indexed by cell id (x * height + y) for g-scores and parents.
+    The target cell is always enterable. Returns [start_pos] if unreachable.
     """
-  
-    def heuristic(a, b):
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
-    
-  
-    occupied = {obj.position for obj in grid_objects if obj.position != target_pos and not obj.is_carried}
-    
-    open_set = {start_pos}
-    closed_set = set()
-    
-    came_from = {}
-    
-    g_score = {start_pos: 0}
-    f_score = {start_pos: heuristic(start_pos, target_pos)}
-    
-    while open_set:
-        current = min(open_set, key=lambda pos: f_score.get(pos, float('inf')))
-        
-        if current == target_pos:
-       
-            path = [current]
-            while current in came_from:
-                current = came_from[current]
-                path.append(current)
+    width, height = grid_size
+    target_x, target_y = target_pos
+    if start_pos == target_pos:
+        return [start_pos]
+    if not (0 <= target_x < width and 0 <= target_y < height):
+        return [start_pos]
+
+    num_cells = width * height
+    blocked = occupied.ravel()
+    g_score = np.full(num_cells, np.iinfo(np.int32).max, dtype=np.int32)
+    came_from = np.full(num_cells, -1, dtype=np.int64)
+    closed = np.zeros(num_cells, dtype=bool)
+
+    start = start_pos[0] * height + start_pos[1]
+    target = target_x * height + target_y
+    g_score[start] = 0
+    h = abs(start_pos[0] - target_x) + abs(start_pos[1] - target_y)
+    # Entries are (f, h, cell); ties on f prefer the node closer to the target
+    open_heap = [(h, h, start)]
+
+    while open_heap:
+        _, _, current = heapq.heappop(open_heap)
+        if closed[current]:
+            continue
+
+        if current == target:
+            path = []
+            while current != -1:
+                path.append((current // height, current % height))
+                current = int(came_from[current])
             path.reverse()
             return path
-        
-        open_set.remove(current)
-        closed_set.add(current)
-        
-      
-        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-            neighbor = (current[0] + dx, current[1] + dy)
-            
-           
-            if (neighbor[0] < 0 or neighbor[0] >= grid_size[0] or
-                neighbor[1] < 0 or neighbor[1] >= grid_size[1] or
-                neighbor in closed_set or
-                neighbor in occupied):
+
+        closed[current] = True
+        x, y = divmod(current, height)
+        tentative_g_score = g_score[current] + 1
+
+        for nx, ny, neighbor in ((x, y + 1, current + 1), (x + 1, y, current + height),
+                                 (x, y - 1, current - 1), (x - 1, y, current - height)):
+            if nx < 0 or nx >= width or ny < 0 or ny >= height:
                 continue
-            
-            tentative_g_score = g_score[current] + 1
-            
-            if neighbor not in open_set:
-                open_set.add(neighbor)
-            elif tentative_g_score >= g_score.get(neighbor, float('inf')):
+            if closed[neighbor] or (blocked[neighbor] and neighbor != target):
                 continue
-            
-            came_from[neighbor] = current
-            g_score[neighbor] = tentative_g_score
-            f_score[neighbor] = g_score[neighbor] + heuristic(neighbor, target_pos)
-    
+            if tentative_g_score < g_score[neighbor]:
+                g_score[neighbor] = tentative_g_score
+                came_from[neighbor] = current
+                h = abs(nx - target_x) + abs(ny - target_y)
+                heapq.heappush(open_heap, (tentative_g_score + h, h, neighbor))
 
     return [start_pos]
 
+def distance_field(start_pos, occupied, grid_size, targets=None, stop_at_first=False):
+    """
+    Breadth-first distance field from start_pos over free cells.
+    Cells marked in the boolean `targets` array can be entered even if occupied,
+    but the search does not continue through them. With stop_at_first the sweep
+    ends once every target at the smallest distance has been reached.
+    Returns flat (distance, came_from) arrays indexed by cell id; unreachable
+    cells have distance -1.
+    """
+    width, height = grid_size
+    num_cells = width * height
+    blocked = occupied.ravel()
+    is_target = targets.ravel() if targets is not None else np.zeros(num_cells, dtype=bool)
+    distance = np.full(num_cells, -1, dtype=np.int32)
+    came_from = np.full(num_cells, -1, dtype=np.int64)
+
+    start = start_pos[0] * height + start_pos[1]
+    distance[start] = 0
+    if stop_at_first and is_target[start]:
+        return distance, came_from
+
+    queue = deque([start])
+    found_distance = None
+    while queue:
+        current = queue.popleft()
+        current_distance = distance[current]
+        if found_distance is not None and current_distance >= found_distance:
+            break
+
+        x, y = divmod(current, height)
+        for nx, ny, neighbor in ((x, y + 1, current + 1), (x + 1, y, current + height),
+                                 (x, y - 1, current - 1), (x - 1, y, current - height)):
+            if nx < 0 or nx >= width or ny < 0 or ny >= height or distance[neighbor] != -1:
+                continue
+            if is_target[neighbor]:
+                distance[neighbor] = current_distance + 1
+                came_from[neighbor] = current
+                if stop_at_first:
+                    found_distance = current_distance + 1
+            elif not blocked[neighbor]:
+                distance[neighbor] = current_distance + 1
+                came_from[neighbor] = current
+                queue.append(neighbor)
+
+    return distance, came_from
+
+def path_from_field(came_from, target_pos, grid_size):
+    """Rebuild the path to target_pos from a distance_field came_from array."""
+    height = grid_size[1]
+    current = target_pos[0] * height + target_pos[1]
+    path = []
+    while current != -1:
+        path.append((current // height, current % height))
+        current = int(came_from[current])
+    path.reverse()
+    return path
+
+ORIENTATIONS = ['N', 'E', 'S', 'W']
+ORIENTATION_STEPS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+
+
+def _oriented_heuristic(x, y, orientation, target_pos, move_cost, turn_cost):
+    """
+    Lower bound on the cost from (x, y) facing `orientation` to target_pos: the
+    Manhattan distance times move_cost plus turn_cost for each turn the
+    remaining offset still needs (none when facing the only axis left, one
+    when side-on or when both axes are left and one is faced, two when facing
+    away).
+    """
+    dx, dy = target_pos[0] - x, target_pos[1] - y
+    if not dx and not dy:
+        return 0
+    ox, oy = ORIENTATION_STEPS[orientation]
+    facing = ox * ((dx > 0) - (dx < 0)) + oy * ((dy > 0) - (dy < 0))
+    turns = 1 - facing + (dx != 0 and dy != 0 and facing == 1)
+    return move_cost * (abs(dx) + abs(dy)) + turn_cost * turns
+
+@profiled("find_path")
+def astar_oriented(start_pos, start_orientation, target_pos, occupied, grid_size, move_cost=1, turn_cost=1):
+    """
+    A* over (x, y, orientation) states, where moving forward costs move_cost and
+    each 90 degree turn costs turn_cost. The heuristic from _oriented_heuristic
+    never drops by more than a step costs, so it is consistent. The target
+    cell is always enterable and may be reached facing any way. Returns the
+    cells to visit, like astar, or [start_pos] if unreachable.
+    """
+    width, height = grid_size
+    target_x, target_y = target_pos
+    if start_pos == target_pos:
+        return [start_pos]
+    if not (0 <= target_x < width and 0 <= target_y < height):
+        return [start_pos]
+
+    # State ids are cell * 4 + orientation, with cells numbered x * height + y as in astar.
+    # Only the states the search touches are stored, so a short leg costs the same on any
+    # grid size; heuristic values are worked out as states are reached
+    orientation = ORIENTATIONS.index(start_orientation)
+    start = (start_pos[0] * height + start_pos[1]) * 4 + orientation
+    target = target_x * height + target_y
+    inf = float('inf')
+    g_score = {start: 0}
+    came_from = {start: -1}
+    closed = set()
+    h = _oriented_heuristic(start_pos[0], start_pos[1], orientation, target_pos, move_cost, turn_cost)
+    open_heap = [(h, h, start)]
+
+    while open_heap:
+        _, _, current = heapq.heappop(open_heap)
+        if current in closed:
+            continue
+
+        cell, orientation = divmod(current, 4)
+        if cell == target:
+            path = []
+            while current != -1:
+                position = divmod(current // 4, height)
+                if not path or path[-1] != position:
+                    path.append(position)
+                current = came_from[current]
+            path.reverse()
+            return path
+
+        closed.add(current)
+        x, y = divmod(cell, height)
+        dx, dy = ORIENTATION_STEPS[orientation]
+        nx, ny = x + dx, y + dy
+        successors = [(cell * 4 + (orientation + 1) % 4, x, y, (orientation + 1) % 4, turn_cost),
+                      (cell * 4 + (orientation - 1) % 4, x, y, (orientation - 1) % 4, turn_cost)]
+        if 0 <= nx < width and 0 <= ny < height:
+            neighbor_cell = nx * height + ny
+            if neighbor_cell == target or not occupied.item(nx, ny):
+                successors.append((neighbor_cell * 4 + orientation, nx, ny, orientation, move_cost))
+
+        current_g_score = g_score[current]
+        for neighbor, sx, sy, so, cost in successors:
+            if neighbor in closed:
+                continue
+            tentative_g_score = current_g_score + cost
+            if tentative_g_score < g_score.get(neighbor, inf):
+                g_score[neighbor] = tentative_g_score
+                came_from[neighbor] = current
+                h = _oriented_heuristic(sx, sy, so, target_pos, move_cost, turn_cost)
+                heapq.heappush(open_heap, (tentative_g_score + h, h, neighbor))
+
+    return [start_pos]
+
+def find_path(start_pos, target_pos, grid_objects, grid_size, orientation=None, move_cost=1, turn_cost=1):
+    """
+    Find a path from start_pos to target_pos avoiding objects.
+    Given the robot's orientation, the path also minimizes the turns it needs.
+    Returns a list of positions to visit.
+    """
+    occupied = build_occupancy(grid_objects, grid_size)
+    if orientation is not None:
+        return astar_oriented(start_pos, orientation, target_pos, occupied, grid_size, move_cost, turn_cost)
+    return astar(start_pos, target_pos, occupied, grid_size)
+
+class WorldIndex:
+    """
+    Cell -> objects index for the objects lying on the grid, with an occupancy
+    bitmap. Updated in O(1) as objects are picked up and dropped.
+    """
+    def __init__(self, grid_size, grid_objects):
+        self.grid_size = grid_size
+        self.cells = {}
+        self.occupancy = np.zeros(grid_size, dtype=bool)
+        if isinstance(grid_objects, ObjectStore):
+            # Index a whole store from its arrays instead of object by object
+            store = grid_objects
+            on_grid = np.flatnonzero(store.on_grid_mask())
+            positions = store.positions[on_grid]
+            for i, position in zip(on_grid.tolist(), map(tuple, positions.tolist())):
+                self.cells.setdefault(position, []).append(store.view(i))
+            self.occupancy[positions[:, 0], positions[:, 1]] = True
+            return
+        for obj in grid_objects:
+            if not obj.is_carried:
+                self.add(obj)
+
+    def add(self, obj):
+        """Register an object lying at obj.position."""
+        self.cells.setdefault(obj.position, []).append(obj)
+        self._refresh(obj.position)
+
+    def remove(self, obj):
+        """Forget an object that is leaving obj.position."""
+        objects = self.cells.get(obj.position)
+        if objects and obj in objects:
+            objects.remove(obj)
+            if not objects:
+                del self.cells[obj.position]
+            self._refresh(obj.position)
+
+    def objects_at(self, position):
+        return self.cells.get(position, [])
+
+    def is_occupied(self, position):
+        return position in self.cells
+
+    def _refresh(self, position):
+        self.occupancy[position] = position in self.cells
+
+
+SortPlan = namedtuple("SortPlan", ["order", "cost", "greedy_cost", "saved", "elapsed"])
+
+
+def plan_sort_schedule(start_pos, store, occupied, sorting_areas, grid_size, time_budget=0.1):
+    """
+    Plan the order in which to carry every unsorted object to its area, as a
+    pickup-and-delivery route. Leg costs are path lengths over the current
+    occupancy, and each object lands on the cell find_position_in_sorting_area
+    picks when approached from where the object was picked up, given the
+    drops before it. Once an area is full, drops open overflow areas in the
+    free tiles the way find_drop_position does.
+    The route starts as the greedy nearest-object order, which is also the
+    baseline, and is improved by 2-opt and relocate moves until none helps or
+    time_budget seconds have passed. Objects that cannot be reached or have no
+    area are left out. Returns a SortPlan whose order holds store indices; the
+    order is empty when the leg costs and the greedy route cannot be worked
+    out within time_budget, and the robot then fetches the nearest object.
+    """
+    start_time = time.perf_counter()
+
+    def out_of_time(margin=0.0):
+        return time.perf_counter() - start_time + margin > time_budget
+
+    def no_plan():
+        return SortPlan([], 0, 0, 0, time.perf_counter() - start_time)
+
+    height = grid_size[1]
+    positions = store.positions[:store.count]
+    cell_ids = positions[:, 0] * height + positions[:, 1]
+
+    # The first matching area of each object, -1 for none
+    object_area = np.full(store.count, -1, dtype=np.int64)
+    for a in reversed(range(len(sorting_areas))):
+        object_area[store.matching_mask(sorting_areas[a])] = a
+    candidates = np.flatnonzero(store.available_mask() & (object_area >= 0))
+
+    targets = np.zeros(grid_size, dtype=bool)
+    targets[positions[candidates, 0], positions[candidates, 1]] = True
+    sweep_start = time.perf_counter()
+    start_distance, _ = distance_field(start_pos, occupied, grid_size, targets)
+    # One more sweep must still fit in the budget before it is started
+    sweep_time = time.perf_counter() - sweep_start
+    jobs = candidates[start_distance[cell_ids[candidates]] >= 0]
+    if not len(jobs) or out_of_time():
+        return no_plan()
+
+    # Every cell a drop may land on, whatever the order; drops are simulated on copies of area_slots
+    job_area = object_area[jobs].tolist()
+    job_cells = [tuple(position) for position in positions[jobs].tolist()]
+    num_jobs = len(jobs)
+    area_slots = []
+    slots = []
+    overflow = overflowing = 0
+    for a, area in enumerate(sorting_areas):
+        area_slots.append(FreeSlots(area.position, area.size, occupied))
+        count = job_area.count(a)
+        slots.extend(area_slots[a].upcoming(count))
+        overflow += max(0, count - area_slots[a].count)
+        overflowing += count > area_slots[a].count
+
+    # Overflow areas take the next free tiles in turn, whichever category fills up first,
+    # so every overflowing category may leave one tile partly used
+    tile_slots = []
+    if overflow:
+        size = sorting_areas[0].size
+        for tile in _free_area_tiles(grid_size, size, sorting_areas):
+            if overflow <= -overflowing * size[0] * size[1]:
+                break
+            tile_slots.append(FreeSlots(tile, size, occupied))
+            slots.extend(tile_slots[-1].upcoming(tile_slots[-1].count))
+            overflow -= tile_slots[-1].count
+        if overflow > 0:
+            return no_plan()
+    slot_ids = {cell: s for s, cell in enumerate(slots)}
+
+    # Paths run through free cells only, so slot -> object and object -> slot costs are the same.
+    # Unreachable legs get a cost no real route can match.
+    penalty = grid_size[0] * grid_size[1]
+    targets[:] = False
+    targets[positions[jobs, 0], positions[jobs, 1]] = True
+    leg = np.empty((len(slots), num_jobs), dtype=np.int64)
+    for s, cell in enumerate(slots):
+        if out_of_time(sweep_time):
+            return no_plan()
+        distance, _ = distance_field(cell, occupied, grid_size, targets)
+        leg[s] = distance[cell_ids[jobs]]
+    leg[leg < 0] = penalty
+    first_leg = start_distance[cell_ids[jobs]].astype(np.int64)
+
+    def start_filling():
+        """Per area, the slots of it and its overflow areas; then the number of tiles opened."""
+        return [[area.copy()] for area in area_slots], [0]
+
+    def drop_slot(filling, job):
+        """Fill and return the slot the job's object lands on, or None when no tile is left."""
+        areas, opened = filling
+        approach = job_cells[job]
+        for slots_left in areas[job_area[job]]:
+            cell = slots_left.nearest(approach)
+            if cell is not None:
+                break
+        while cell is None:
+            if opened[0] == len(tile_slots):
+                return None
+            slots_left = tile_slots[opened[0]].copy()
+            opened[0] += 1
+            areas[job_area[job]].append(slots_left)
+            cell = slots_left.nearest(approach)
+        slots_left.update(cell, True)
+        return slot_ids[cell]
+
+    def route_cost(order):
+        filling = start_filling()
+        drop_slots = [drop_slot(filling, job) for job in order.tolist()]
+        if None in drop_slots:
+            return penalty * (2 * num_jobs + 1)
+        drop_slots = np.array(drop_slots, dtype=np.int64)
+        return int(first_leg[order[0]] + leg[drop_slots, order].sum() + leg[drop_slots[:-1], order[1:]].sum())
+
+    # Greedy: always fetch the nearest remaining object, ties to the lowest store index
+    order = np.empty(num_jobs, dtype=np.int64)
+    remaining = np.ones(num_jobs, dtype=bool)
+    filling = start_filling()
+    distances = first_leg
+    for k in range(num_jobs):
+        if out_of_time():
+            return no_plan()
+        job = int(np.argmin(np.where(remaining, distances, np.iinfo(np.int64).max)))
+        order[k] = job
+        remaining[job] = False
+        slot = drop_slot(filling, job)
+        if slot is None:
+            return no_plan()
+        distances = leg[slot]
+    greedy_cost = cost = route_cost(order)
+
+    improved = True
+    while improved and not out_of_time():
+        improved = False
+        # 2-opt: reverse a stretch of the route
+        for i in range(num_jobs - 1):
+            for j in range(i + 1, num_jobs):
+                candidate = order.copy()
+                candidate[i:j + 1] = order[i:j + 1][::-1]
+                candidate_cost = route_cost(candidate)
+                if candidate_cost < cost:
+                    order, cost, improved = candidate, candidate_cost, True
+            if out_of_time():
+                break
+        # Relocate: move one pickup elsewhere in the route
+        for i in range(num_jobs):
+            for j in range(num_jobs):
+                if i == j:
+                    continue
+                candidate = np.insert(np.delete(order, i), j, order[i])
+                candidate_cost = route_cost(candidate)
+                if candidate_cost < cost:
+                    order, cost, improved = candidate, candidate_cost, True
+            if out_of_time():
+                break
+
+    return SortPlan([int(i) for i in jobs[order]], cost, greedy_cost, greedy_cost - cost,
+                    time.perf_counter() - start_time)
+
+SimulationEvent = namedtuple("SimulationEvent", ["kind", "message"])
+ObjectState = namedtuple("ObjectState", ["shape", "color", "position", "is_carried", "is_properly_sorted"])
+WorldSnapshot = namedtuple("WorldSnapshot", ["pos", "orientation", "grid_size", "store",
+                                             "sorting_areas", "carried_object", "status_message",
+                                             "inventory"])
+
+
+def _shape_patch(shape, color, **kwargs):
+    """Build a patch for a shape in cell coordinates, centered on (0.5, 0.5)."""
+    if shape == 'circle':
+        return patches.Circle((0.5, 0.5), radius=0.6, fc=color, **kwargs)
+    elif shape == 'triangle':
+        return patches.RegularPolygon((0.5, 0.5), numVertices=3, radius=0.6, fc=color, **kwargs)
+    return patches.Rectangle((0.2, 0.2), 0.6, 0.6, fc=color, **kwargs)
+
+ORIENTATION_ANGLES = {'N': 0, 'E': -90, 'S': 180, 'W': 90}
+ORIENTATION_OFFSETS = {'N': (0, 0.4), 'E': (0.4, 0), 'S': (0, -0.4), 'W': (-0.4, 0)}
+
+
+class GridRenderer:
+    """
+    Retained-mode renderer subscribed to the robot's events.
+    Sorting areas and objects are created once and only the objects whose
+    position or state changed are updated. The robot, the carried indicator
+    and the texts are animated artists blitted over a cached background, so
+    most frames do not redraw the grid at all. With show_profile the
+    profiler's table is overlaid on the grid.
+    """
+    def __init__(self, fig, ax, frame_delay=0.05, show_profile=False):
+        self.fig = fig
+        self.ax = ax
+        self.canvas = fig.canvas
+        self.frame_delay = frame_delay
+        self.show_profile = show_profile
+        self._layout_key = None
+        self._object_artists = []
+        self._background = None
+        self._animated = []
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def __call__(self, robot, event):
+        self.render(robot, event.message)
+        if self.frame_delay:
+            with profiler.phase("frame_delay"):
+                time.sleep(self.frame_delay)
+
+    @profiled("update_display")
+    def render(self, state, status_message=""):
+        """Bring the artists up to date with state (a robot or a snapshot) and show them."""
+        full_redraw = self._sync_layout(state)
+        full_redraw = self._sync_objects(state.store) or full_redraw
+        self._sync_robot(state, status_message)
+        self._sync_profile()
+
+        if full_redraw or self._background is None or not self.canvas.supports_blit:
+            # _on_draw captures the new background and draws the animated artists
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_animated()
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    def _on_draw(self, event):
+        if self.canvas.supports_blit:
+            self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._animated:
+            if artist.axes is self.ax and artist.get_visible():
+                self.ax.draw_artist(artist)
+
+    def _cell_transform(self):
+        offset = transforms.Affine2D()
+        return offset, offset + self.ax.transData
+
+    def _sync_layout(self, state):
+        """Rebuild every artist when the grid or the sorting areas change."""
+        layout_key = (tuple(state.grid_size), tuple(id(area) for area in state.sorting_areas))
+        # Something else cleared the axes, so the artists are gone
+        if layout_key == self._layout_key and self._status_text.axes is self.ax:
+            return False
+        self._layout_key = layout_key
+
+        ax = self.ax
+        grid_size = state.grid_size
+        ax.clear()
+        ax.set_xlim(0, grid_size[0])
+        ax.set_ylim(0, grid_size[1])
+        ax.set_facecolor('white')
+        ax.grid(False)
+        ax.set_xlabel('X-axis', fontsize=14)
+        ax.set_ylabel('Y-axis', fontsize=14)
+        ax.set_title('Robot Grid Environment', fontsize=18)
+
+        for area in state.sorting_areas:
+            area.draw(ax)
+
+        self._object_artists = []
+        self._robot_offset, robot_transform = self._cell_transform()
+        self._sprite_pixels = sprite_pixels(ax, grid_size)
+        sprite = robot_sprites.get(state.orientation, self._sprite_pixels)
+        if sprite is not None:
+            self._robot_sprite = ax.imshow(sprite, extent=[-0.5, 1.5, -0.5, 1.5], zorder=10, animated=True)
+            self._robot_sprite.set_transform(robot_transform)
+            self._robot_arrow = None
+            self._sprite_orientation = state.orientation
+        else:
+            self._robot_sprite = ax.add_patch(patches.Circle((0.5, 0.5), radius=0.9, fc='blue', ec='black', lw=3,
+                                                             transform=robot_transform, animated=True))
+            self._arrow_rotation = transforms.Affine2D()
+            self._robot_arrow = ax.add_patch(patches.FancyArrow(0.5, 0.5, 0, 0.9, head_width=0.3, head_length=0.3,
+                                                                fc='white', ec='black', lw=2, animated=True,
+                                                                transform=self._arrow_rotation + robot_transform))
+        self._indicator = None
+        self._indicator_key = None
+        self._indicator_offset, self._indicator_transform = self._cell_transform()
+        self._carried_text = ax.text(0.1, grid_size[1] - 0.5, "",
+                                     horizontalalignment='left', verticalalignment='center',
+                                     bbox=dict(facecolor='white', alpha=0.7),
+                                     fontsize=16, animated=True)
+        self._status_text = ax.text(grid_size[0] / 2, -0.5, "",
+                                    horizontalalignment='center', verticalalignment='center',
+                                    bbox=dict(facecolor='lightblue', alpha=0.7),
+                                    fontsize=16, animated=True)
+        self._profile_text = ax.text(0.01, 0.99, "", transform=ax.transAxes,
+                                     horizontalalignment='left', verticalalignment='top',
+                                     family='monospace', fontsize=8, zorder=12,
+                                     bbox=dict(facecolor='white', alpha=0.8),
+                                     visible=False, animated=True)
+        self._refresh_animated()
+        return True
+
+    def _sync_objects(self, store):
+        """Update the artists of objects that moved, were picked up or got sorted."""
+        count = store.count
+        positions = store.positions[:count]
+        carried = store.carried[:count]
+        is_sorted = store.sorted[:count]
+
+        # Artists are matched to objects by row, which works for the live store and snapshots alike
+        known = len(self._object_artists)
+        for i in range(known, count):
+            offset, transform = self._cell_transform()
+            halo = self.ax.add_patch(patches.Circle((0.5, 0.5), radius=0.9, fc='none', ec='gold', lw=4,
+                                                    transform=transform))
+            patch = self.ax.add_patch(_shape_patch(store.shape_names[store.shape_codes[i]],
+                                                   store.color_names[store.color_codes[i]], transform=transform))
+            self._object_artists.append((offset, halo, patch))
+
+        changed = np.ones(count, dtype=bool)
+        if known:
+            previous = self._object_state
+            changed[:known] = ((positions[:known] != previous[0]).any(axis=1) |
+                               (carried[:known] != previous[1]) | (is_sorted[:known] != previous[2]))
+
+        changed_rows = np.flatnonzero(changed)
+        for i in changed_rows:
+            offset, halo, patch = self._object_artists[i]
+            offset.clear().translate(positions[i, 0], positions[i, 1])
+            patch.set_visible(not carried[i])
+            halo.set_visible(bool(is_sorted[i] and not carried[i]))
+
+        self._object_state = (positions.copy(), carried.copy(), is_sorted.copy())
+        return len(changed_rows) > 0
+
+    def _sync_robot(self, state, status_message):
+        """Update the animated robot, carried indicator and texts."""
+        x, y = state.pos
+        orientation = state.orientation
+        carried_object = state.carried_object
+        self._robot_offset.clear().translate(x, y)
+
+        if self._robot_arrow is None:
+            if orientation != self._sprite_orientation:
+                self._robot_sprite.set_data(robot_sprites.get(orientation, self._sprite_pixels))
+                self._sprite_orientation = orientation
+            indicator_x, indicator_y = x, y
+        else:
+            self._robot_sprite.set_facecolor(carried_object.color if carried_object else 'blue')
+            self._arrow_rotation.clear().rotate_deg_around(0.5, 0.5, ORIENTATION_ANGLES.get(orientation, 0))
+            dx, dy = ORIENTATION_OFFSETS.get(orientation, (0, 0))
+            indicator_x, indicator_y = x + dx, y + dy
+
+        indicator_key = (carried_object.shape, carried_object.color) if carried_object else None
+        if indicator_key != self._indicator_key:
+            if self._indicator is not None:
+                self._indicator.remove()
+                self._indicator = None
+            if carried_object:
+                self._indicator = self.ax.add_patch(_shape_patch(
+                    carried_object.shape, carried_object.color, ec='black', zorder=11, alpha=0.7,
+                    animated=True, transform=self._indicator_transform))
+            self._indicator_key = indicator_key
+            self._refresh_animated()
+        self._indicator_offset.clear().translate(indicator_x, indicator_y)
+
+        if state.inventory:
+            self._carried_text.set_text(_carrying_label(state.inventory))
+        self._carried_text.set_visible(bool(state.inventory))
+        self._status_text.set_text(status_message)
+        self._status_text.set_visible(bool(status_message))
+
+    def _sync_profile(self):
+        """Show the profiler's table while show_profile is set."""
+        visible = self.show_profile and profiler.enabled
+        if visible:
+            self._profile_text.set_text(profiler.report())
+        self._profile_text.set_visible(visible)
+
+    def _refresh_animated(self):
+        self._animated = [artist for artist in (self._robot_sprite, self._robot_arrow, self._indicator,
+                                                self._carried_text, self._status_text, self._profile_text)
+                          if artist is not None]
+
 class AutonomousRobot:
-    """Class to manage an autonomous robot that can sort objects."""
-    def __init__(self, initial_pos, initial_orientation, grid_size, grid_objects, fig, ax):
+    """
+    Class to manage an autonomous robot that can sort objects.
+    The simulation itself never draws or sleeps: every state change is emitted
+    as a SimulationEvent to the subscribed listeners. Passing fig and ax
+    subscribes a GridRenderer for them.
+    """
+    def __init__(self, initial_pos, initial_orientation, grid_size, grid_objects, fig=None, ax=None):
         self.pos = initial_pos
         self.orientation = initial_orientation
         self.grid_size = grid_size
         self.grid_objects = grid_objects
-        self.fig = fig
-        self.ax = ax
-        self.carried_object = None
+        self.listeners = []
+        # Carried objects in pickup order, at most carry_capacity of them
+        self.inventory = []
+        self.carry_capacity = 1
         self.is_sorting = False
         self.sort_key_func = None
         self.sorting_areas = []
         self.current_action = ""
         self.sorting_complete = False
         self.target_object = None
+        # The carried object being taken to its area
+        self.delivering = None
         self.path = []
         self.target_orientation = None
+        self.store = ObjectStore.from_objects(grid_objects)
+        self.world = WorldIndex(grid_size, self.store)
+        # Counters for steps, turns, distance travelled, pickups, drops and planner calls
+        self.stats = Counter()
+        # Seconds to spend planning the pickup order up front; None picks the nearest object each time
+        self.plan_budget = None
+        self.sort_plan = None
+        self.schedule = deque()
+        # Path costs of a forward step and a 90 degree turn; turn_cost 0 plans by distance alone
+        self.move_cost = 1
+        self.turn_cost = 1
+
+        if fig is not None and ax is not None:
+            self.subscribe(GridRenderer(fig, ax))
+
+    @property
+    def carried_object(self):
+        """The object picked up last, or None when the robot carries nothing."""
+        return self.inventory[-1] if self.inventory else None
+
+    def subscribe(self, listener):
+        """Call listener(robot, event) on every state change."""
+        self.listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def emit(self, kind, message=""):
+        """Notify the listeners of a state change."""
+        event = SimulationEvent(kind, message)
+        for listener in self.listeners:
+            listener(self, event)
     
+    def snapshot(self, status_message=""):
+        """Return an immutable copy of everything a renderer needs, safe to hand to another thread."""
+        inventory = tuple(ObjectState(obj.shape, obj.color, obj.position, obj.is_carried,
+                                      obj.is_properly_sorted) for obj in self.inventory)
+        carried = inventory[-1] if inventory else None
+        return WorldSnapshot(self.pos, self.orientation, self.grid_size, self.store.copy(),
+                             list(self.sorting_areas), carried, status_message, inventory)
+
     def update_display(self, status_message=""):
-        """Update the display with the current state."""
-        draw_grid(self.pos, self.orientation, self.fig, self.ax, 
-                 self.grid_objects, self.sorting_areas, self.carried_object, 
-                 status_message, self.grid_size)
-        time.sleep(0.05)  # Reduced from 0.2 to 0.05 for faster animation
+        """Ask the listeners to show the current state with a status message."""
+        self.emit("status", status_message)
     
     def turn_to_orientation(self, target_orientation):
         """Turn the robot to face the target orientation."""
@@ -468,12 +1970,13 @@ class AutonomousRobot:
         target_idx = orientations.index(target_orientation)
         
        
+        self.stats["turns"] += 1
         if (idx + 1) % 4 == target_idx:
             self.orientation = orientations[(idx + 1) % 4] 
-            self.update_display(f"Turning right to face {self.orientation}")
+            self.emit("turn", f"Turning right to face {self.orientation}")
         else:
             self.orientation = orientations[(idx - 1) % 4]  
-            self.update_display(f"Turning left to face {self.orientation}")
+            self.emit("turn", f"Turning left to face {self.orientation}")
             
         return self.orientation == target_orientation
     
@@ -503,86 +2006,220 @@ class AutonomousRobot:
    
         self.pos = next_pos
         self.path.pop(0)  
-        self.update_display(f"Moving to position {self.pos}")
+        self.stats["distance"] += 1
+        self.emit("move", f"Moving to position {self.pos}")
         
         return len(self.path) <= 1
     
     def pick_up_object(self, obj):
-        """Pick up the specified object."""
-        if self.carried_object:
+        """Pick up the specified object, if there is room in the inventory."""
+        if len(self.inventory) >= self.carry_capacity:
             return True
         if self.pos != obj.position:
             return False
         
     
         if obj.is_properly_sorted:
-            self.update_display(f"Object is already sorted, leaving it alone")
+            self.emit("status", f"Object is already sorted, leaving it alone")
             return True
             
+        self.world.remove(obj)
         obj.is_carried = True
-        self.carried_object = obj
-        self.update_display(f"Picking up {obj.color} {obj.shape}")
+        self.stats["pickups"] += 1
+        self.inventory.append(obj)
+        self.emit("pick_up", f"Picking up {obj.color} {obj.shape}")
         
         return True
     
-    def drop_object(self):
-        """Drop the carried object at the current position."""
-        if not self.carried_object:
+    def drop_object(self, obj=None):
+        """Drop a carried object (the one picked up last by default) at the current position."""
+        if obj is None:
+            obj = self.carried_object
+        if obj not in self.inventory:
             return True  
         
       
         for area in self.sorting_areas:
-            if area.contains_position(self.pos) and area.is_matching_object(self.carried_object):
-                self.carried_object.is_properly_sorted = True
-                self.update_display(f"Object is now properly sorted")
+            if area.contains_position(self.pos) and area.is_matching_object(obj):
+                obj.is_properly_sorted = True
+                self.emit("sorted", f"Object is now properly sorted")
                 break
             
-        self.carried_object.position = self.pos
-        self.carried_object.is_carried = False
-        self.update_display(f"Dropping {self.carried_object.color} {self.carried_object.shape}")
-        self.carried_object = None
+        self.inventory.remove(obj)
+        obj.position = self.pos
+        obj.is_carried = False
+        self.world.add(obj)
+        self.stats["drops"] += 1
+        self.emit("drop", f"Dropping {obj.color} {obj.shape}")
         
         return True
     
+    def plan_path(self, target_pos):
+        """Plan the cheapest path to target_pos from the robot's position and orientation."""
+        if not self.turn_cost:
+            return astar(self.pos, target_pos, self.world.occupancy, self.grid_size)
+        return astar_oriented(self.pos, self.orientation, target_pos, self.world.occupancy,
+                              self.grid_size, self.move_cost, self.turn_cost)
+
     def find_nearest_unsorted_object(self):
         """Find the nearest object that isn't carried and isn't properly sorted."""
-        available_objects = [obj for obj in self.grid_objects 
-                             if not obj.is_carried and 
-                             not obj.is_properly_sorted and 
-                             not (self.carried_object and obj == self.carried_object)]
-        
-        if not available_objects:
-            return None
-            
-  
-        nearest_obj = None
-        shortest_path_length = float('inf')
-        
-        for obj in available_objects:
-            path = find_path(self.pos, obj.position, 
-                             [o for o in self.grid_objects if o != obj and not o.is_carried], 
-                             self.grid_size)
-            if len(path) < shortest_path_length:
-                shortest_path_length = len(path)
-                nearest_obj = obj
-                
+        nearest_obj, _ = self.plan_to_nearest_unsorted_object()
         return nearest_obj
+
+    def sortable_mask(self):
+        """Objects lying on the grid, not sorted yet, that some sorting area accepts."""
+        matching = np.zeros(self.store.count, dtype=bool)
+        for area in self.sorting_areas:
+            matching |= self.store.matching_mask(area)
+        return self.store.available_mask() & matching
+
+    @profiled("find_nearest_unsorted_object")
+    def plan_to_nearest_unsorted_object(self):
+        """
+        Rank every unsorted object with one distance-field sweep from the robot.
+        Returns (object, path) for the nearest reachable one, or (None, None).
+        With a turn_cost the sweep's path is not used: the chosen object's
+        path is searched again with astar_oriented, which costs a second
+        search but keeps ranking on the cheap cell-level sweep.
+        """
+        store = self.store
+        available = self.sortable_mask()
+        if not available.any():
+            return None, None
+        self.stats["planner_calls"] += 1
+
+        positions = store.positions[:store.count]
+        targets = np.zeros(self.grid_size, dtype=bool)
+        targets[positions[available, 0], positions[available, 1]] = True
+        distance, came_from = distance_field(self.pos, self.world.occupancy, self.grid_size,
+                                             targets, stop_at_first=True)
+
+        # Ties go to the object listed first, as before
+        object_distance = distance[positions[:, 0] * self.grid_size[1] + positions[:, 1]]
+        reachable = available & (object_distance >= 0)
+        if not reachable.any():
+            return None, None
+        candidates = np.flatnonzero(reachable & (object_distance == object_distance[reachable].min()))
+        nearest_obj = store.view(candidates[0])
+        if self.turn_cost:
+            # The sweep ignores turns, so its path may zigzag; replan the chosen object's
+            # path with them. Ranking by an oriented sweep instead would expand four
+            # times the states for every object on the grid, not just for the one chosen
+            return nearest_obj, self.plan_path(nearest_obj.position)
+        return nearest_obj, path_from_field(came_from, nearest_obj.position, self.grid_size)
     
-    def find_position_in_sorting_area(self, area):
-        """Find an available position in the sorting area."""
+    @profiled("find_position_in_sorting_area")
+    def find_position_in_sorting_area(self, area, approach=None):
+        """
+        Find the free cell of the sorting area to drop into next, nearest to
+        approach (the robot's position by default) among the cells that keep
+        the rest of the area reachable. Returns None when the area is full.
+        """
+        slots = area.slots or area.track_slots(self.world)
+        slots.sync(self.world)
+        return slots.nearest(approach or self.pos)
 
-        occupied_positions = {obj.position for obj in self.grid_objects 
-                             if not obj.is_carried and obj != self.carried_object}
-        
+    def plan_to_slot(self, area, paths=None):
+        """
+        Plan to the free cell of area to drop into next. When objects lying
+        around the area wall that cell in, plan to the nearest cell the robot
+        can reach among those the area may fill next instead. Returns
+        (cell, path), or (None, None) when the area is full or they are all
+        walled in. paths caches the path to each cell across calls.
+        """
+        position = self.find_position_in_sorting_area(area)
+        if position is None:
+            return None, None
+        paths = {} if paths is None else paths
+        if position not in paths:
+            paths[position] = self.plan_path(position)
+            self.stats["planner_calls"] += 1
+        path = paths[position]
+        if len(path) > 1 or self.pos == position:
+            return position, path
+
+        targets = np.zeros(self.grid_size, dtype=bool)
+        for cell in area.slots.upcoming(1):
+            targets[cell] = True
+        distance, came_from = distance_field(self.pos, self.world.occupancy, self.grid_size,
+                                             targets, stop_at_first=True)
+        self.stats["planner_calls"] += 1
+        reached = np.flatnonzero(targets.ravel() & (distance >= 0))
+        if not len(reached):
+            return None, None
+        cell = divmod(int(reached[np.argmin(distance[reached])]), self.grid_size[1])
+        if self.turn_cost:
+            return cell, self.plan_path(cell)
+        return cell, path_from_field(came_from, cell, self.grid_size)
+
+    def find_drop_position(self, obj, paths=None, wait_if_walled_in=False):
+        """
+        Pick the area and cell to drop obj into, and the path there: the first
+        matching area with a free slot the robot can reach, or a new overflow
+        area once none has one. Returns (area, None, None) when no overflow
+        area fits, and (None, None, None) when obj matches no area or the
+        robot cannot reach the overflow area. With wait_if_walled_in, areas
+        whose free cells are all walled in do not count as full: (None, None,
+        None) is returned rather than opening an overflow area, as the objects
+        walling them in may be picked up first.
+        """
+        matching = [area for area in self.sorting_areas if area.is_matching_object(obj)]
+        if not matching:
+            return None, None, None
+        for area in matching:
+            position, path = self.plan_to_slot(area, paths)
+            if position is not None:
+                return area, position, path
+        if wait_if_walled_in and any(area.slots.count for area in matching):
+            return None, None, None
+        while True:
+            area = self.add_overflow_area(matching[0])
+            if area is None:
+                return matching[0], None, None
+            position, path = self.plan_to_slot(area, paths)
+            if position is not None:
+                return area, position, path
+            if area.slots.count:
+                # Out of reach even with free cells, as further areas would likely be too
+                return None, None, None
 
-        for x in range(area.position[0], area.position[0] + area.size[0]):
-            for y in range(area.position[1], area.position[1] + area.size[1]):
-                if (x, y) not in occupied_positions:
-                    return (x, y)
+    def plan_next_drop(self, wait_if_walled_in=False):
+        """
+        Choose the carried object to deliver next, the one with the nearest
+        drop cell. Returns (object, path), or (None, None) when no carried
+        object has an area (or, with wait_if_walled_in, one the robot can
+        reach; see find_drop_position). When an object's areas are all full
+        and no overflow area fits, sorting stops with an "overflow" event.
+        """
+        paths = {}
+        best, best_path = None, None
+        for obj in self.inventory:
+            area, position, path = self.find_drop_position(obj, paths, wait_if_walled_in)
+            if area is None:
+                continue
+            if position is None:
+                # Every matching area is full and the grid has no room for another
+                self.current_action = ""
+                self.is_sorting = False
+                self.emit("overflow", f"No room left for {self.sort_key_func(obj)} objects")
+                return None, None
+            if best is None or len(path) < len(best_path):
+                best, best_path = obj, path
+        return best, best_path
 
-        center_x = area.position[0] + area.size[0] // 2
-        center_y = area.position[1] + area.size[1] // 2
-        return (center_x, center_y)
+    def add_overflow_area(self, area):
+        """
+        Open another area for area's category in the next spot of the sorting
+        area tiling that no area covers yet. Returns it, or None when the grid
+        has no spot left.
+        """
+        for x, y in _free_area_tiles(self.grid_size, area.size, self.sorting_areas):
+            overflow = SortingArea(area.category_type, area.category_value, (x, y), area.size)
+            overflow.track_slots(self.world)
+            self.sorting_areas.append(overflow)
+            self.emit("overflow", f"{area.category_value} area is full, opening another at {(x, y)}")
+            return overflow
+        return None
     
     def initialize_sorting(self, sort_by):
         """Initialize the sorting process."""
@@ -590,60 +2227,100 @@ class AutonomousRobot:
         self.sorting_complete = False
         self.current_action = "FINDING_OBJECT"
 
-        self.sorting_areas = create_sorting_areas(self.grid_size, sort_by)
+        # One area per category the store knows, including any beyond COLORS and SHAPES
+        categories = {"SORT_BY_COLOR": self.store.color_names, "SORT_BY_SHAPE": self.store.shape_names}
+        self.sorting_areas = create_sorting_areas(self.grid_size, sort_by, categories.get(sort_by))
+        for area in self.sorting_areas:
+            area.track_slots(self.world)
         
         if sort_by == "SORT_BY_COLOR":
             self.sort_key_func = lambda obj: obj.color
-            self.update_display(f"Starting to sort by color")
+            self.emit("sorting_started", f"Starting to sort by color")
             
         elif sort_by == "SORT_BY_SHAPE":
             self.sort_key_func = lambda obj: obj.shape
-            self.update_display(f"Starting to sort by shape")
+            self.emit("sorting_started", f"Starting to sort by shape")
+
+        self.sort_plan = None
+        self.schedule = deque()
+        if self.plan_budget is not None:
+            self.sort_plan = plan_sort_schedule(self.pos, self.store, self.world.occupancy,
+                                                self.sorting_areas, self.grid_size, self.plan_budget)
+            self.schedule = deque(self.sort_plan.order)
+            if self.sort_plan.order:
+                self.emit("plan", f"Planned {len(self.sort_plan.order)} pickups, "
+                                  f"{self.sort_plan.saved} steps shorter than greedy")
+            else:
+                self.emit("plan", "No pickup plan within the budget, fetching the nearest object each time")
+
+    def next_scheduled_object(self):
+        """
+        Take the next object of the planned schedule that still needs sorting.
+        Returns (object, path), or (None, None) once the schedule is used up.
+        """
+        while self.schedule:
+            obj = self.store.view(self.schedule.popleft())
+            if obj.is_carried or obj.is_properly_sorted:
+                continue
+            path = self.plan_path(obj.position)
+            self.stats["planner_calls"] += 1
+            if len(path) > 1 or self.pos == obj.position:
+                return obj, path
+        return None, None
     
     def perform_sorting_step(self):
         """Perform one step of the sorting process."""
         if not self.is_sorting or self.sorting_complete:
             return
-            
+        self.stats["steps"] += 1
+        with profiler.phase(self.current_action):
+            self._advance_sorting()
+
+    def _advance_sorting(self):
+        """Run the current sorting state once; perform_sorting_step times it as that state's phase."""
         if self.current_action == "FINDING_OBJECT":
-            if self.carried_object:
-       
-                object_key = self.sort_key_func(self.carried_object)
-                
-       
-                target_area = None
-                for area in self.sorting_areas:
-                    if area.is_matching_object(self.carried_object):
-                        target_area = area
-                        break
-                
-                if target_area:
-             
-                    target_position = self.find_position_in_sorting_area(target_area)
-                    
-    
-                    self.path = find_path(self.pos, target_position, 
-                                         [obj for obj in self.grid_objects if not obj.is_carried], 
-                                         self.grid_size)
-                    self.current_action = "MOVING_TO_TARGET"
-                    self.update_display(f"Moving to drop off point in {object_key} area")
+            # Collect while the inventory has room and the next object is nearer than the
+            # next drop, so one tour picks up several objects and then drops each in turn
+            nearest_obj, path = None, None
+            scheduled = False
+            if len(self.inventory) < self.carry_capacity:
+                nearest_obj, path = self.next_scheduled_object()
+                scheduled = nearest_obj is not None
+                if nearest_obj is None:
+                    nearest_obj, path = self.plan_to_nearest_unsorted_object()
+
+            delivery, drop_path = self.plan_next_drop(wait_if_walled_in=True) if self.inventory else (None, None)
+            if delivery is None and nearest_obj is None and self.inventory:
+                # Nothing more to pick up, so stop waiting for walled-in drop cells to open
+                delivery, drop_path = self.plan_next_drop()
+            if not self.is_sorting:
+                return
+
+            if delivery is not None and (nearest_obj is None or len(drop_path) <= len(path)):
+                if scheduled:
+                    self.schedule.appendleft(nearest_obj.index)
+                object_key = self.sort_key_func(delivery)
+                self.delivering = delivery
+                self.path = drop_path
+                self.current_action = "MOVING_TO_TARGET"
+                self.emit("plan", f"Moving to drop off point in {object_key} area")
+            elif nearest_obj:
+                self.target_object = nearest_obj
+                self.path = path
+                self.current_action = "MOVING_TO_OBJECT"
+                self.emit("plan", f"Moving to pick up {nearest_obj.color} {nearest_obj.shape}")
+            elif self.inventory:
+                # Only objects no sorting area accepts, or none the robot can reach, are left
+                self.current_action = ""
+                self.is_sorting = False
+                carried = ", ".join(f"{obj.color} {obj.shape}" for obj in self.inventory)
+                self.emit("unsortable", f"No sorting area the robot can reach for {carried}")
             else:
-          
-                nearest_obj = self.find_nearest_unsorted_object()
-                
-                if nearest_obj:
-                    self.target_object = nearest_obj
-                    self.path = find_path(self.pos, nearest_obj.position, 
-                                         [obj for obj in self.grid_objects if obj != nearest_obj and not obj.is_carried], 
-                                         self.grid_size)
-                    self.current_action = "MOVING_TO_OBJECT"
-                    self.update_display(f"Moving to pick up {nearest_obj.color} {nearest_obj.shape}")
-                else:
-         
-                    self.current_action = ""
-                    self.sorting_complete = True
-                    self.is_sorting = False
-                    self.update_display("Sorting complete!")
+     
+                self.current_action = ""
+                self.sorting_complete = True
+                self.is_sorting = False
+                self.emit("sorting_complete", "Sorting complete!")
         
         elif self.current_action == "MOVING_TO_OBJECT":
             if self.pos == self.target_object.position:
@@ -661,7 +2338,8 @@ class AutonomousRobot:
         elif self.current_action == "MOVING_TO_TARGET":
             if len(self.path) <= 1: 
                 # Drop the object
-                self.drop_object()
+                self.drop_object(self.delivering)
+                self.delivering = None
                 self.current_action = "FINDING_OBJECT"
             else:
                
@@ -676,20 +2354,359 @@ class AutonomousRobot:
         command = interpret_command(task)
         
         if command in ["SORT_BY_COLOR", "SORT_BY_SHAPE"]:
-            self.initialize_sorting(command)
-            
-
-            while self.is_sorting and not self.sorting_complete:
-                self.perform_sorting_step()
-                self.fig.canvas.draw_idle() 
-                time.sleep(0.02)  # Reduced from 0.1 to 0.02 for faster animation
-                
+            self.run_sorting(command)
             return "Sorting complete!"
         else:
             return f"Command '{command}' not supported for autonomous operation."
 
+    def execute_command(self, command, max_steps=None):
+        """
+        Carry out an interpreted command and return a result message. Sorting
+        runs until it completes or takes max_steps steps; the other commands
+        take a single step, the way the old interactive controller did.
+        """
+        if command in ["SORT_BY_COLOR", "SORT_BY_SHAPE"]:
+            self.run_sorting(command, max_steps)
+            if self.sorting_complete:
+                return "Sorting complete!"
+            self.cancel_sorting()
+            return "Sorting stopped before completion."
+
+        if command in ["MOVE_FORWARD", "TURN_LEFT", "TURN_RIGHT"]:
+            pos, orientation = update_robot_state(self.pos, self.orientation, command, self.grid_size)
+            if (pos, orientation) == (self.pos, self.orientation):
+                return "Blocked by the edge of the grid."
+            self.stats["steps"] += 1
+            if pos != self.pos:
+                self.pos = pos
+                self.stats["distance"] += 1
+                self.emit("move", f"Moving to position {self.pos}")
+            else:
+                self.orientation = orientation
+                self.stats["turns"] += 1
+                self.emit("turn", f"Turning to face {self.orientation}")
+            return f"At {self.pos} facing {self.orientation}"
+
+        if command == "PICK_UP":
+            if len(self.inventory) >= self.carry_capacity:
+                return "Inventory is full."
+            for obj in self.world.objects_at(self.pos):
+                if not obj.is_properly_sorted:
+                    self.stats["steps"] += 1
+                    self.pick_up_object(obj)
+                    return f"Picked up {obj.color} {obj.shape}"
+            return "Nothing to pick up here."
+
+        if command == "DROP":
+            obj = self.carried_object
+            if obj is None:
+                return "Not carrying anything."
+            self.stats["steps"] += 1
+            self.drop_object(obj)
+            return f"Dropped {obj.color} {obj.shape}"
+
+        return f"Command '{command}' not supported."
+
+    def cancel_sorting(self):
+        """Stop the running sort; a carried object stays in the gripper."""
+        if self.is_sorting:
+            self.is_sorting = False
+            self.current_action = ""
+            self.path = []
+            self.target_object = None
+            self.delivering = None
+            self.target_orientation = None
+            self.schedule.clear()
+            self.emit("sorting_cancelled", "Sorting cancelled")
+
+    def run_sorting(self, sort_by, max_steps=None):
+        """Sort the grid as fast as the listeners allow. Returns the number of steps taken."""
+        self.initialize_sorting(sort_by)
+        steps = 0
+        while self.is_sorting and not self.sorting_complete:
+            if max_steps is not None and steps >= max_steps:
+                break
+            self.perform_sorting_step()
+            steps += 1
+        return steps
+
+class FrameScheduler:
+    """
+    Decide how many simulation micro-steps (turns, moves, picks, drops) run
+    per rendered frame. At 1x the robot makes BASE_STEPS_PER_SECOND
+    micro-steps per second, the pace of the old 50 ms animation; a speed of
+    None runs as many as fit in the frame budget.
+    """
+    BASE_STEPS_PER_SECOND = 20
+
+    def __init__(self, target_fps=30, speed=1.0):
+        self.target_fps = target_fps
+        self.speed = speed
+        self._credit = 0.0
+
+    @property
+    def frame_time(self):
+        return 1.0 / self.target_fps
+
+    def step_budget(self):
+        """Micro-steps to run in the next frame, or None for as many as fit."""
+        if self.speed is None:
+            return None
+        self._credit += self.speed * self.BASE_STEPS_PER_SECOND * self.frame_time
+        budget = int(self._credit)
+        self._credit -= budget
+        return budget
+
+SPEED_OPTIONS = OrderedDict([("1x", 1.0), ("10x", 10.0), ("max", None)])
+
+
+class RobotWorker(threading.Thread):
+    """
+    Run command classification and the simulation off the Tk main thread.
+    Commands are queued with submit(). The simulation advances as many steps
+    as the FrameScheduler allows per frame and then publishes one snapshot;
+    a snapshot the GUI has not picked up yet is replaced (the frame is
+    dropped). Results are put on `updates` as text. The running sort can be
+    paused, resumed and cancelled.
+    """
+    def __init__(self, robot, target_fps=30, speed=1.0):
+        super().__init__(name="robot-worker", daemon=True)
+        self.robot = robot
+        self.scheduler = FrameScheduler(target_fps, speed)
+        self.commands = queue.Queue()
+        self.updates = queue.Queue()
+        self.frames_published = 0
+        self.frames_dropped = 0
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancel = threading.Event()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = None
+        self._status_message = ""
+        self._steps = 0
+        self._dirty = False
+        robot.subscribe(self._on_event)
+
+    def submit(self, command_text):
+        self.commands.put(command_text)
+
+    def set_speed(self, speed):
+        """Set the speed multiplier, or None to run as fast as possible."""
+        self.scheduler.speed = speed
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    @property
+    def is_paused(self):
+        return not self._resume.is_set()
+
+    def cancel(self):
+        """Cancel the command that is running, if any."""
+        self._cancel.set()
+        self._resume.set()
+
+    def take_snapshot(self):
+        """Return the newest unrendered snapshot, or None."""
+        with self._snapshot_lock:
+            snapshot, self._snapshot = self._snapshot, None
+        return snapshot
+
+    def run(self):
+        while True:
+            command_text = self.commands.get()
+            self._cancel.clear()
+            try:
+                result = self._run_command(command_text)
+            except Exception as e:
+                result = f"Error: {e}"
+            self._publish()
+            self.updates.put(result)
+
+    def _run_command(self, command_text):
+        command = interpret_command(command_text)
+        if command not in ["SORT_BY_COLOR", "SORT_BY_SHAPE"]:
+            return f"Command '{command}' not supported for autonomous operation."
+
+        robot = self.robot
+        robot.initialize_sorting(command)
+        while robot.is_sorting and not robot.sorting_complete:
+            if not self._resume.is_set():
+                self._publish()
+                self._resume.wait()
+            if self._cancel.is_set():
+                robot.cancel_sorting()
+                return "Sorting cancelled."
+            self._run_frame()
+        return "Sorting complete!" if robot.sorting_complete else "Sorting stopped before completion."
+
+    def _run_frame(self):
+        """Advance the simulation for one frame and publish the resulting state."""
+        robot = self.robot
+        deadline = time.perf_counter() + self.scheduler.frame_time
+        budget = self.scheduler.step_budget()
+        self._steps = 0
+        while (robot.is_sorting and not robot.sorting_complete and
+               (budget is None or self._steps < budget) and
+               time.perf_counter() < deadline):
+            robot.perform_sorting_step()
+        self._publish()
+
+        remaining = deadline - time.perf_counter()
+        if budget is not None and remaining > 0:
+            with profiler.phase("frame_wait"):
+                time.sleep(remaining)
+
+    def _on_event(self, robot, event):
+        self._steps += 1
+        self._status_message = event.message
+        self._dirty = True
+
+    def _publish(self):
+        if not self._dirty:
+            return
+        snapshot = self.robot.snapshot(self._status_message)
+        with self._snapshot_lock:
+            if self._snapshot is not None:
+                self.frames_dropped += 1
+            self._snapshot = snapshot
+        self.frames_published += 1
+        self._dirty = False
+
+def read_command_batches(stream, batch_size=8):
+    """
+    Yield the commands in stream, one per line, in lists of up to batch_size.
+    Blank lines and lines starting with '#' are skipped.
+    """
+    batch = []
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def run_command_script(robot, stream, batch_size=8, max_steps=None):
+    """
+    Interpret the commands in stream in batches and execute them one by one
+    on robot, yielding a result dict per command. classify_time is the
+    command's share of its batch's classification time. When classifying a
+    batch fails (e.g. the model cannot be loaded), each of its commands is
+    reported with source "error" and the run goes on with the next batch.
+    """
+    index = 0
+    for batch in read_command_batches(stream, batch_size):
+        start = time.perf_counter()
+        try:
+            interpretations = classify_commands(batch, batch_size)
+            error = None
+        except Exception as e:
+            interpretations = [Interpretation(None, {}, "error")] * len(batch)
+            error = f"Error: {e}"
+        classify_time = (time.perf_counter() - start) / len(batch)
+
+        for text, interpretation in zip(batch, interpretations):
+            before = Counter(robot.stats)
+            start = time.perf_counter()
+            if error is not None:
+                result = error
+            else:
+                try:
+                    result = robot.execute_command(interpretation.label, max_steps)
+                except Exception as e:
+                    result = f"Error: {e}"
+            execute_time = time.perf_counter() - start
+
+            yield {
+                "index": index,
+                "command": text,
+                "label": interpretation.label,
+                "source": interpretation.source,
+                "score": interpretation.scores.get(interpretation.label),
+                "result": result,
+                "classify_time": classify_time,
+                "execute_time": execute_time,
+                "steps": robot.stats["steps"] - before["steps"],
+                "position": list(robot.pos),
+                "orientation": robot.orientation,
+                "carrying": len(robot.inventory),
+                "sorted": robot.store.count_sorted(),
+            }
+            index += 1
+
+def run_script(args, grid_objects):
+    """Run a command script headless and stream one JSON line per command to stdout."""
+    robot = AutonomousRobot((0, 0), 'N', tuple(args.grid_size), grid_objects)
+    robot.carry_capacity = args.carry_capacity
+
+    stream = sys.stdin if args.script == "-" else open(args.script)
+    try:
+        for record in run_command_script(robot, stream, args.batch_size, args.max_steps):
+            print(json.dumps(record), flush=True)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
 def main():
-  
+    parser = argparse.ArgumentParser(description="Control the sorting robot with natural language commands.")
+    parser.add_argument("--script", metavar="FILE",
+                        help="Run the commands in FILE ('-' for stdin) headless and print a JSON line "
+                             "per command instead of opening the window")
+    parser.add_argument("--batch-size", type=int, default=8, help="Commands classified together")
+    parser.add_argument("--grid-size", type=int, nargs=2, default=[15, 15], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--objects", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the object layout")
+    parser.add_argument("--max-steps", type=int, default=None, help="Stop each sort after this many steps")
+    parser.add_argument("--carry-capacity", type=int, default=1, help="Objects the robot can carry at once")
+    parser.add_argument("--backend", choices=CLASSIFIER_BACKENDS, default="pipeline")
+    parser.add_argument("--model", default=None, help="Classifier model name or local directory")
+    parser.add_argument("--command-cache", metavar="FILE",
+                        help="Keep interpreted commands in this sqlite file across runs")
+    parser.add_argument("--intent-threshold", type=float, default=None,
+                        help="Try the embedding intent engine first, accepting matches at or above "
+                             "this similarity")
+    args = parser.parse_args()
+    if args.backend == "distilled" and args.model is None:
+        parser.error("--backend distilled needs --model with the distilled model's directory")
+
+    # Build the layout up front so a grid too small for the areas or objects is a usage error
+    if args.seed is not None:
+        random.seed(args.seed)
+    grid_size = tuple(args.grid_size)
+    try:
+        dummy_sorting_areas = create_sorting_areas(grid_size, "SORT_BY_COLOR")
+        grid_objects = generate_random_objects(args.objects, grid_size, dummy_sorting_areas)
+    except ValueError as e:
+        parser.error(f"--grid-size {grid_size[0]} {grid_size[1]} with --objects {args.objects}: {e}")
+
+    global intent_engine, command_cache
+    classifier_provider.set_backend(args.backend, args.model)
+    if args.intent_threshold is not None:
+        intent_engine = EmbeddingIntentClassifier(threshold=args.intent_threshold)
+    if args.command_cache:
+        command_cache = CommandCache(path=args.command_cache)
+    if args.script:
+        try:
+            run_script(args, grid_objects)
+        finally:
+            command_cache.close()
+        return
+
+    startup_start = time.perf_counter()
+    if tk is None:
+        raise SystemExit("The GUI needs tkinter; use AutonomousRobot without fig/ax for headless runs.")
+    matplotlib.use('TkAgg')
+
+    # Load the classifier while the window is being built
+    classifier_provider.warm_up()
+
     plt.ioff()
     
     
@@ -700,13 +2717,6 @@ def main():
 
     robot_pos = (0, 0)
     robot_orientation = 'N'
-    grid_size = (15, 15)
-    
-    
-    dummy_sorting_areas = create_sorting_areas(grid_size, "SORT_BY_COLOR")
-    
-
-    grid_objects = generate_random_objects(4, grid_size, dummy_sorting_areas) 
    
     fig = plt.figure(figsize=(10, 10))  
     ax = fig.add_subplot(111)
@@ -716,8 +2726,15 @@ def main():
     canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
     
   
-    robot = AutonomousRobot(robot_pos, robot_orientation, grid_size, grid_objects, fig, ax)
-    robot.update_display("Waiting for command...")
+    robot = AutonomousRobot(robot_pos, robot_orientation, grid_size, grid_objects)
+    robot.carry_capacity = args.carry_capacity
+    renderer = GridRenderer(fig, ax)
+    renderer.render(robot.snapshot(), "Waiting for command...")
+    print(f"Window ready in {time.perf_counter() - startup_start:.2f}s")
+
+    worker = RobotWorker(robot, target_fps=30)
+    worker.start()
+    frame_interval = int(1000 / worker.scheduler.target_fps)
     
  
     input_frame = tk.Frame(root, bg='#e0e0e0', pady=10)
@@ -738,19 +2755,60 @@ def main():
         if command_text.strip():  
             result_label.config(text="Processing command...")
             command_entry.delete(0, tk.END) 
-            
- 
-            def run_task():
-                result = robot.start_autonomous_task(command_text)
-                result_label.config(text=result)
-            
+            worker.submit(command_text)
+
+    def toggle_pause():
+        if worker.is_paused:
+            worker.resume()
+            pause_button.config(text='Pause')
+        else:
+            worker.pause()
+            pause_button.config(text='Resume')
+
+    def cancel_task():
+        worker.cancel()
+        pause_button.config(text='Pause')
+
+    def toggle_profile():
+        if profile_var.get():
+            profiler.enable()
+        else:
+            profiler.disable()
+        renderer.show_profile = profiler.enabled
 
-            root.after(100, run_task)
+    def drain_updates():
+        snapshot = worker.take_snapshot()
+        if snapshot is not None:
+            renderer.render(snapshot, snapshot.status_message)
+        while True:
+            try:
+                result_label.config(text=worker.updates.get_nowait())
+            except queue.Empty:
+                break
+        root.after(frame_interval, drain_updates)
     
 
     submit_button = tk.Button(input_frame, text='Send Command', command=process_command,
                            bg='#4CAF50', fg='white', padx=20, pady=5, font=('Arial', 12, 'bold'))
     submit_button.pack(side=tk.LEFT, padx=10)
+
+    pause_button = tk.Button(input_frame, text='Pause', command=toggle_pause,
+                             padx=10, pady=5, font=('Arial', 10, 'bold'))
+    pause_button.pack(side=tk.LEFT, padx=5)
+
+    cancel_button = tk.Button(input_frame, text='Cancel', command=cancel_task,
+                              padx=10, pady=5, font=('Arial', 10, 'bold'))
+    cancel_button.pack(side=tk.LEFT, padx=5)
+
+    speed_var = tk.StringVar(value="1x")
+    for speed_name in SPEED_OPTIONS:
+        tk.Radiobutton(input_frame, text=speed_name, value=speed_name, variable=speed_var,
+                       command=lambda: worker.set_speed(SPEED_OPTIONS[speed_var.get()]),
+                       bg='#e0e0e0', font=('Arial', 10)).pack(side=tk.LEFT)
+
+    profile_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(input_frame, text='Profile', variable=profile_var, command=toggle_profile,
+                   bg='#e0e0e0', font=('Arial', 10)).pack(side=tk.LEFT, padx=5)
     
 
     command_entry.bind('<Return>', lambda event: process_command())
@@ -768,8 +2826,15 @@ def main():
                           padx=10, pady=5, font=('Arial', 10, 'bold'))
     quit_button.pack(side=tk.RIGHT, padx=10)
     
+    root.after(frame_interval, drain_updates)
+
     # Start the GUI event loop
     root.mainloop()
+    command_cache.close()
+
+    if profiler.summary():
+        profiler.dump(PROFILE_DUMP_PATH)
+        print(f"Profile written to {PROFILE_DUMP_PATH}")
 
 if __name__ == "__main__":
     main()